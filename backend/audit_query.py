@@ -0,0 +1,102 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from database import AuditLog
+
+# ── Audit Queries ─────────────────────────────────────────
+# Keyset (cursor) pagination over audit_logs. Pages are ordered newest
+# first on (timestamp, id); the cursor is the last row's key, so each page
+# is an index range scan (ix_audit_logs_ts_id when unfiltered) no matter
+# how deep the caller has paged.
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, *types) -> list:
+    # types: the expected type of each cursor value, e.g. (str, int)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if (not isinstance(values, list) or len(values) != len(types)
+            or not all(type(v) is t for v, t in zip(values, types))):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def serialize_log(log: AuditLog) -> dict:
+    return {
+        "id": log.id,
+        "employee_id": log.employee_id,
+        "customer_id": log.customer_id,
+        "product_recommended": log.product_recommended,
+        "life_event": log.life_event,
+        "persona": log.persona,
+        "confidence": log.confidence,
+        "guardrail": log.guardrail,
+        "reason": log.reason,
+        "timestamp": log.timestamp.isoformat() if log.timestamp else None,
+    }
+
+
+def query_audit_logs(db: Session, limit=100, cursor=None, customer_id=None, employee_id=None,
+                     product=None, persona=None, guardrail=None, start=None, end=None):
+    query = db.query(AuditLog)
+    if customer_id is not None:
+        query = query.filter(AuditLog.customer_id == customer_id)
+    if employee_id is not None:
+        query = query.filter(AuditLog.employee_id == employee_id)
+    if product is not None:
+        query = query.filter(AuditLog.product_recommended == product)
+    if persona is not None:
+        query = query.filter(AuditLog.persona == persona)
+    if guardrail is not None:
+        query = query.filter(AuditLog.guardrail == guardrail)
+    if start is not None:
+        query = query.filter(AuditLog.timestamp >= start)
+    if end is not None:
+        query = query.filter(AuditLog.timestamp < end)
+
+    if cursor:
+        ts, last_id = decode_cursor(cursor, str, int)
+        try:
+            ts = datetime.fromisoformat(ts)
+        except ValueError:
+            raise ValueError("Invalid cursor")
+        query = query.filter(or_(
+            AuditLog.timestamp < ts,
+            and_(AuditLog.timestamp == ts, AuditLog.id < last_id)
+        ))
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows  = query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+    return [serialize_log(r) for r in rows], next_cursor
+
+
+def distinct_customers(db: Session, limit=MAX_PAGE_SIZE, cursor=None):
+    query = db.query(AuditLog.customer_id).distinct()
+    if cursor:
+        query = query.filter(AuditLog.customer_id > decode_cursor(cursor, str)[0])
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    ids   = [r[0] for r in query.order_by(AuditLog.customer_id).limit(limit + 1).all()]
+
+    next_cursor = None
+    if len(ids) > limit:
+        ids = ids[:limit]
+        next_cursor = encode_cursor(ids[-1])
+
+    return ids, next_cursor
@@ -0,0 +1,110 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import func, delete
+from sqlalchemy.orm import Session
+from database import AuditLog, AuditRollup
+
+# ── Audit Rollups ─────────────────────────────────────────
+# audit_rollups keeps a running count per (day, product, persona, guardrail).
+# It is incremented in the same transaction that inserts the audit rows, so
+# stats queries aggregate a few rollup rows instead of scanning audit_logs.
+# Rows tagged FALLBACK_GUARDRAIL (default recommendations served while the
+# LLM was down) stay in audit_logs but are left out of the rollups, so an
+# outage does not show up as a spike in product stats.
+
+FALLBACK_GUARDRAIL = "fallback"
+
+ROLLUP_DIMENSIONS = {
+    "day":       AuditRollup.day,
+    "product":   AuditRollup.product,
+    "persona":   AuditRollup.persona,
+    "guardrail": AuditRollup.guardrail,
+}
+
+
+def rollup_key(row: dict):
+    timestamp = row.get("timestamp") or datetime.utcnow()
+    return (
+        timestamp.date(),
+        row.get("product_recommended") or "",
+        row.get("persona") or "",
+        row.get("guardrail") or "passed",
+    )
+
+
+def _upsert(db: Session, counts: Counter):
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        for (day, product, persona, guardrail), n in counts.items():
+            stmt = insert(AuditRollup).values(
+                day=day, product=product, persona=persona, guardrail=guardrail, count=n
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["day", "product", "persona", "guardrail"],
+                set_={"count": AuditRollup.count + stmt.excluded.count}
+            ))
+        return
+
+    for (day, product, persona, guardrail), n in counts.items():
+        updated = db.query(AuditRollup).filter(
+            AuditRollup.day == day,
+            AuditRollup.product == product,
+            AuditRollup.persona == persona,
+            AuditRollup.guardrail == guardrail,
+        ).update({AuditRollup.count: AuditRollup.count + n}, synchronize_session=False)
+        if not updated:
+            db.add(AuditRollup(day=day, product=product, persona=persona, guardrail=guardrail, count=n))
+
+
+def increment_rollups(db: Session, rows):
+    counts = Counter(rollup_key(row) for row in rows if row.get("guardrail") != FALLBACK_GUARDRAIL)
+    if counts:
+        _upsert(db, counts)
+
+
+def rebuild_rollups(db: Session):
+    # Recompute every rollup row from audit_logs with a single GROUP BY.
+    day = func.date(AuditLog.timestamp)
+    grouped = (
+        db.query(
+            day,
+            func.coalesce(AuditLog.product_recommended, ""),
+            func.coalesce(AuditLog.persona, ""),
+            func.coalesce(AuditLog.guardrail, "passed"),
+            func.count(AuditLog.id),
+        )
+        .filter(func.coalesce(AuditLog.guardrail, "") != FALLBACK_GUARDRAIL)
+        .group_by(day, AuditLog.product_recommended, AuditLog.persona, AuditLog.guardrail)
+        .all()
+    )
+    counts = Counter()
+    for d, product, persona, guardrail, n in grouped:
+        if isinstance(d, str):
+            d = datetime.strptime(d, "%Y-%m-%d").date()
+        counts[(d, product, persona, guardrail)] += n
+
+    db.execute(delete(AuditRollup))
+    for (d, product, persona, guardrail), n in counts.items():
+        db.add(AuditRollup(day=d, product=product, persona=persona, guardrail=guardrail, count=n))
+    db.commit()
+
+
+def ensure_rollups(db: Session):
+    # Backfill once when rollups are introduced on a database that already
+    # has audit history.
+    if db.query(AuditRollup.id).first() is None and db.query(AuditLog.id).first() is not None:
+        rebuild_rollups(db)
+
+
+def rollup_stats(db: Session, group_by, start=None, end=None):
+    columns = [ROLLUP_DIMENSIONS[g] for g in group_by]
+    query = db.query(*columns, func.sum(AuditRollup.count))
+    if start is not None:
+        query = query.filter(AuditRollup.day >= start)
+    if end is not None:
+        query = query.filter(AuditRollup.day <= end)
+    return query.group_by(*columns).order_by(*columns).all()
@@ -0,0 +1,283 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError, InterfaceError, TimeoutError as PoolTimeout
+from database import SessionLocal, AuditLog
+from audit_stats import increment_rollups
+from metrics import registry, STAGE_SECONDS
+
+# ── Background Audit Writer ───────────────────────────────
+# Request handlers hand AuditLog rows (as plain dicts) to a bounded queue;
+# a single background thread bulk-inserts them when AUDIT_BATCH_SIZE rows
+# are waiting or AUDIT_FLUSH_INTERVAL seconds have passed. stop() drains
+# the queue before returning, and write(..., wait=True) blocks until the
+# row's batch is committed for callers that must read their own write.
+# Async handlers use enqueue(), which never touches the database itself.
+# Each batch also bumps the audit_rollups counters in the same transaction.
+#
+# When the database is unreachable, rows are retried AUDIT_RETRIES times
+# with exponential backoff and then appended to AUDIT_SPILL_PATH; the spill
+# file is replayed on start and after the next batch that commits. Only a
+# row the database rejects (bad data) is dropped, and it is logged.
+# On serverless platforms the flush thread may never run after a response,
+# so there AUDIT_SYNC_WRITES defaults to true.
+
+SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+
+AUDIT_BATCH_SIZE     = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))
+AUDIT_QUEUE_SIZE     = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_SYNC_WRITES    = os.getenv("AUDIT_SYNC_WRITES", "true" if SERVERLESS else "false").lower() == "true"
+AUDIT_RETRIES        = int(os.getenv("AUDIT_RETRIES", "3"))
+AUDIT_RETRY_BACKOFF  = float(os.getenv("AUDIT_RETRY_BACKOFF", "0.5"))
+AUDIT_SPILL_PATH     = os.getenv("AUDIT_SPILL_PATH", "data/audit_spill.ndjson")
+
+# errors that mean the database could not be reached, not that the row is bad
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, PoolTimeout, ConnectionError)
+
+_STOP = object()
+
+
+class _Waiter:
+
+    def __init__(self):
+        self.done  = threading.Event()
+        self.error = None
+
+
+class AuditWriter:
+
+    def __init__(self, session_factory=SessionLocal, batch_size=AUDIT_BATCH_SIZE,
+                 flush_interval=AUDIT_FLUSH_INTERVAL, max_queue=AUDIT_QUEUE_SIZE,
+                 retries=AUDIT_RETRIES, backoff=AUDIT_RETRY_BACKOFF, spill_path=AUDIT_SPILL_PATH):
+        self.session_factory = session_factory
+        self.batch_size      = batch_size
+        self.flush_interval  = flush_interval
+        self.retries         = retries
+        self.backoff         = backoff
+        self.spill_path      = spill_path
+        self._queue          = queue.Queue(maxsize=max_queue)
+        self._thread         = None
+        self._lock           = threading.Lock()
+        self._spill_lock     = threading.Lock()
+        self.written         = 0
+        self.failed          = 0
+        self.spilled         = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=30):
+        with self._lock:
+            if not self.running:
+                return
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def enqueue(self, row: dict):
+        # Never blocks: False when the writer is not running or the queue is
+        # full, in which case the caller should write(row) off the event loop.
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait((row, None))
+        except queue.Full:
+            return False
+        return True
+
+    def write(self, row: dict, wait=False):
+        # Falls back to a direct insert when the writer is not running or the
+        # queue is full, raising to the caller if that insert fails.
+        waiter = _Waiter() if wait else None
+        if self.running:
+            try:
+                self._queue.put_nowait((row, waiter))
+            except queue.Full:
+                self._write_now(row)
+                return
+            if waiter is not None:
+                waiter.done.wait()
+                if waiter.error is not None:
+                    raise waiter.error
+            return
+        self._write_now(row)
+
+    def _write_now(self, row):
+        # same retry / spill handling as a queued batch, on the caller's thread
+        error = self._store([row]).get(0)
+        if error is not None:
+            raise error
+
+    def flush(self):
+        if self.running:
+            self.write(None, wait=True)
+
+    def insert_rows(self, rows):
+        now  = datetime.utcnow()
+        rows = [{"timestamp": now, **row} if row.get("timestamp") is None else row for row in rows]
+        db   = self.session_factory()
+        try:
+            with STAGE_SECONDS.time("db_commit"):
+                db.execute(insert(AuditLog), rows)
+                increment_rollups(db, rows)
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _insert_each(self, items):
+        # items: (index, row); returns the (index, row, error) that failed
+        failures = []
+        for i, row in items:
+            try:
+                self.insert_rows([row])
+                self.written += 1
+            except Exception as e:
+                failures.append((i, row, e))
+        return failures
+
+    def _store(self, rows):
+        # {index: error} for rows neither committed nor spilled
+        try:
+            self.insert_rows(rows)
+            self.written += len(rows)
+            return {}
+        except Exception as e:
+            # One bad row (e.g. malformed LLM output) fails the whole bulk
+            # insert; row by row, only that row is lost.
+            print(f"⚠️ Audit batch of {len(rows)} rows failed, retrying row by row: {e}")
+
+        failures = self._insert_each(list(enumerate(rows)))
+        for attempt in range(self.retries):
+            transient = [(i, row) for i, row, e in failures if isinstance(e, TRANSIENT_ERRORS)]
+            if not transient:
+                break
+            time.sleep(self.backoff * 2 ** attempt)
+            failures = [f for f in failures if not isinstance(f[2], TRANSIENT_ERRORS)] + self._insert_each(transient)
+
+        errors = {}
+        for i, row, error in failures:
+            if isinstance(error, TRANSIENT_ERRORS) and self._spill(row):
+                continue
+            errors[i] = error
+            self.failed += 1
+            print(f"❌ Audit write failed for customer {row.get('customer_id')}: {error}")
+        return errors
+
+    def _spill(self, row):
+        if not self.spill_path:
+            return False
+        try:
+            with self._spill_lock:
+                directory = os.path.dirname(self.spill_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.spill_path, "a") as f:
+                    f.write(json.dumps(row, default=str) + "\n")
+        except OSError as e:
+            print(f"❌ Audit spill failed: {e}")
+            return False
+        self.spilled += 1
+        return True
+
+    def replay_spill(self):
+        # inserts rows spilled while the database was down; rows that still
+        # cannot be written are spilled again
+        if not self.spill_path:
+            return 0
+        replaying = f"{self.spill_path}.replay"
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path) or os.path.getsize(self.spill_path) == 0:
+                return 0
+            os.replace(self.spill_path, replaying)
+        with open(replaying) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        for row in rows:
+            if row.get("timestamp"):
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        os.remove(replaying)
+        for i in range(0, len(rows), self.batch_size):
+            self._store(rows[i:i + self.batch_size])
+        print(f"✅ Replayed {len(rows)} spilled audit rows")
+        return len(rows)
+
+    def _write_batch(self, batch):
+        rows    = [(i, row) for i, (row, _) in enumerate(batch) if row is not None]
+        written = self.written
+        failed  = self._store([row for _, row in rows]) if rows else {}
+        errors = [None] * len(batch)
+        for j, error in failed.items():
+            errors[rows[j][0]] = error
+        for (_, waiter), error in zip(batch, errors):
+            if waiter is not None:
+                waiter.error = error
+                waiter.done.set()
+        if self.written > written:
+            # the database is reachable again
+            self.replay_spill()
+
+    def _run(self):
+        self.replay_spill()
+        batch    = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            stopping = item is _STOP
+            if item is not None and not stopping:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            flush_now = (
+                stopping
+                or len(batch) >= self.batch_size
+                or (deadline is not None and time.monotonic() >= deadline)
+                or (item is not None and item[1] is not None)
+            )
+            if flush_now and batch:
+                self._write_batch(batch)
+                batch    = []
+                deadline = None
+
+            if stopping:
+                # drain anything that raced in behind the stop marker
+                rest = []
+                while True:
+                    try:
+                        rest.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                rest = [r for r in rest if r is not _STOP]
+                if rest:
+                    self._write_batch(rest)
+                return
+
+
+audit_writer = AuditWriter()
+
+registry.register_callback("finpulse_audit_queue_depth", "Audit rows waiting for the writer",
+                           lambda: audit_writer._queue.qsize())
+registry.register_callback("finpulse_audit_rows_total", "Audit rows handled by the writer",
+                           lambda: {"written": audit_writer.written, "failed": audit_writer.failed,
+                                    "spilled": audit_writer.spilled},
+                           kind="counter", labels=("result",))
@@ -1,11 +1,14 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from database import get_db, User
+from database import get_db, SessionLocal, User
+from metrics import registry
+from collections import OrderedDict
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,22 +17,99 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_HOURS = 8
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-bearer_scheme = HTTPBearer()
+# Resolved users are cached per employee_id for AUTH_CACHE_TTL seconds
+# (0 disables). With AUTH_TRUST_CLAIMS the signed token's claims are used
+# directly whenever they carry the full profile, so no lookup happens.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
+AUTH_TRUST_CLAIMS = os.getenv("AUTH_TRUST_CLAIMS", "false").lower() == "true"
 
-def hash_password(password: str) -> str:
-    password = password[:72]
-    return pwd_context.hash(password)
+PROFILE_FIELDS = ("employee_id", "name", "email", "role")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    plain_password = plain_password[:72]
-    return pwd_context.verify(plain_password, hashed_password)
+bearer_scheme = HTTPBearer()
 
 def create_token(data: dict) -> str:
     payload = data.copy()
     payload["exp"] = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+_cache_lookups = registry.counter(
+    "finpulse_auth_cache_lookups_total", "Authenticated-user profile cache lookups by result", ("result",))
+
+def _cached_profile(employee_id: str):
+    with _user_cache_lock:
+        entry = _user_cache.get(employee_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del _user_cache[employee_id]
+            return None
+        _user_cache.move_to_end(employee_id)
+        return entry[0]
+
+def _cache_profile(profile: dict):
+    if AUTH_CACHE_TTL <= 0:
+        return
+    with _user_cache_lock:
+        _user_cache[profile["employee_id"]] = (profile, time.monotonic() + AUTH_CACHE_TTL)
+        _user_cache.move_to_end(profile["employee_id"])
+        while len(_user_cache) > AUTH_CACHE_MAX:
+            _user_cache.popitem(last=False)
+
+def invalidate_user(employee_id: str):
+    # call after changing a user's role or profile
+    with _user_cache_lock:
+        _user_cache.pop(employee_id, None)
+
+def clear_user_cache():
+    with _user_cache_lock:
+        _user_cache.clear()
+
+def profile_claims(user: User) -> dict:
+    return {
+        "sub": user.employee_id,
+        "name": user.name,
+        "email": user.email,
+        "role": user.role
+    }
+
+def _lookup_profile(employee_id: str, db: Session):
+    # (profile, user): cached profile, else loaded from the DB and cached;
+    # user is the ORM row on a cache miss, (None, None) if there is none
+    profile = _cached_profile(employee_id)
+    _cache_lookups.inc("miss" if profile is None else "hit")
+    if profile is not None:
+        return profile, None
+    user = db.query(User).filter(User.employee_id == employee_id).first()
+    if not user:
+        return None, None
+    profile = {f: getattr(user, f) for f in PROFILE_FIELDS}
+    profile["id"] = user.id
+    _cache_profile(profile)
+    return profile, user
+
+def token_is_admin(token: str) -> bool:
+    # Same role resolution as get_current_user, for code with no DB session
+    # at hand (the profiling middleware); only flagged requests call it.
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return False
+    employee_id = payload.get("sub")
+    if not employee_id:
+        return False
+    if AUTH_TRUST_CLAIMS and all(payload.get(f) for f in ("name", "email", "role")):
+        return payload["role"] == "admin"
+
+    db = SessionLocal()
+    try:
+        profile, _ = _lookup_profile(employee_id, db)
+    finally:
+        db.close()
+    return profile is not None and profile["role"] == "admin"
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
     db: Session = Depends(get_db)
@@ -43,7 +123,19 @@ def get_current_user(
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.query(User).filter(User.employee_id == employee_id).first()
-    if not user:
+    if AUTH_TRUST_CLAIMS and all(payload.get(f) for f in ("name", "email", "role")):
+        return User(employee_id=employee_id, name=payload["name"], email=payload["email"], role=payload["role"])
+
+    profile, user = _lookup_profile(employee_id, db)
+    if profile is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
\ No newline at end of file
+    if user is not None:
+        return user
+
+    # a fresh detached instance per request, so callers never share state
+    return User(**profile)
+
+def require_admin(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from passwords import HashPool, hash_password, verify_password
+
+# ── Login Throughput Benchmark ────────────────────────────
+# Verifies a burst of passwords through HashPool at increasing worker
+# counts and reports verifications/sec, showing how login throughput
+# scales with cores. Runs offline; no database or API needed.
+#
+#   python benchmarks/bench_login.py [--logins 200]
+
+async def burst(pool, hashed, logins):
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        pool.run(verify_password, "correct horse", hashed) for _ in range(logins)
+    ])
+    assert all(results)
+    return time.perf_counter() - started
+
+def main():
+    logins = int(sys.argv[sys.argv.index("--logins") + 1]) if "--logins" in sys.argv else 200
+    hashed = hash_password("correct horse")
+    cores  = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+
+    started = time.perf_counter()
+    for _ in range(min(logins, 20)):
+        verify_password("correct horse", hashed)
+    inline = min(logins, 20) / (time.perf_counter() - started)
+    print(f"{'inline':>8}  {inline:8.1f} logins/sec")
+
+    for workers in counts:
+        pool = HashPool(workers=workers, queue_size=logins)
+        asyncio.run(burst(pool, hashed, workers))  # warm the worker processes
+        elapsed = asyncio.run(burst(pool, hashed, logins))
+        pool.shutdown()
+        print(f"{workers:>8}  {logins / elapsed:8.1f} logins/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# ── Concurrent Signup Load Test ───────────────────────────
+# Several worker processes, each with its own EmployeeIdAllocator and
+# several threads, allocate IDs and insert users into one shared database
+# exactly as /auth/signup does. The run fails if any signup hits the
+# unique constraint or two users end up with the same employee_id.
+# bcrypt is skipped (a fixed hash is stored) so the rate measured is ID
+# allocation plus the insert.
+#
+#   python benchmarks/load_signup.py --processes 4 --threads 8 --signups 2000
+#
+# Defaults to a throwaway SQLite file, which exercises the reserved-block
+# allocator only. The PostgreSQL sequence path is covered only when
+# DATABASE_URL points at PostgreSQL; the summary line names the path used.
+
+def worker(args):
+    worker_no, threads, signups = args
+    from concurrent.futures import ThreadPoolExecutor
+    from database import SessionLocal, User
+    from employee_ids import employee_ids
+
+    def signup(i):
+        db = SessionLocal()
+        try:
+            employee_id = employee_ids.next_id()
+            db.add(User(
+                employee_id=employee_id,
+                name=f"Load {worker_no}-{i}",
+                email=f"load-{worker_no}-{i}@finpulse.test",
+                password_hash="x",
+                role="analyst"
+            ))
+            db.commit()
+            return employee_id
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(signup, range(signups)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--signups", type=int, default=2000, help="total signups")
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(), "signup_load.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}?timeout=30"
+
+    from database import create_tables, SessionLocal, User
+    from employee_ids import employee_ids
+    create_tables()
+    allocator = "sequence" if employee_ids.uses_sequence else "block"
+
+    per_worker = args.signups // args.processes
+    started = time.perf_counter()
+    with Pool(args.processes) as pool:
+        batches = pool.map(worker, [(w, args.threads, per_worker) for w in range(args.processes)])
+    elapsed = time.perf_counter() - started
+
+    ids = [i for batch in batches for i in batch]
+    db = SessionLocal()
+    stored = [r[0] for r in db.query(User.employee_id).filter(User.email.like("load-%")).all()]
+    db.close()
+
+    assert len(ids) == len(set(ids)), "duplicate employee IDs allocated"
+    assert sorted(ids) == sorted(stored), "allocated IDs do not match stored users"
+    print(f"{len(ids)} signups in {elapsed:.2f}s ({len(ids) / elapsed:.1f} signups/sec), "
+          f"{allocator} allocator, no collisions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+
+
+# ── Startup Benchmark ─────────────────────────────────────
+# Cold-start cost of the API as a serverless worker sees it: each run is a
+# fresh interpreter that imports main, runs the startup hook and serves its
+# first requests against a pre-migrated throwaway SQLite database. Fails
+# (exit 1) when a median exceeds its budget or when a module that should
+# load lazily (pandas, groq) is imported during startup.
+#
+#   python benchmarks/startup.py --runs 10 --output startup.json
+#   python benchmarks/startup.py --import-budget-ms 800 --compare startup.json
+#
+# Results use the same shape as suite.py, so --compare works across both.
+
+LAZY_MODULES = ("pandas", "numpy", "groq", "pyarrow")
+
+
+def child():
+    # one cold start; prints a JSON line of timings (ms)
+    started = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    loaded = [m for m in LAZY_MODULES if m in sys.modules]
+
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        ready = time.perf_counter()
+        assert client.get("/health").status_code == 200
+        first = time.perf_counter()
+        assert client.get("/metrics").status_code == 200
+        second = time.perf_counter()
+
+    print(json.dumps({
+        "import_ms":        (imported - started) * 1000,
+        "startup_hook_ms":  (ready - imported) * 1000,
+        "first_request_ms": (first - ready) * 1000,
+        "next_request_ms":  (second - first) * 1000,
+        "cold_start_ms":    (first - started) * 1000,
+        "lazy_loaded":      loaded,
+    }))
+
+
+def summarize(name, timings):
+    timings = sorted(timings)
+    mean = statistics.fmean(timings)
+    result = {
+        "name":        name,
+        "size":        "cold",
+        "runs":        len(timings),
+        "mean_ms":     round(mean, 3),
+        "p50_ms":      round(statistics.median(timings), 3),
+        "p95_ms":      round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "ops_per_sec": round(1000 / mean, 2) if mean else None,
+    }
+    print(f"  {name:<28} mean {result['mean_ms']:>10.3f} ms  p50 {result['p50_ms']:>10.3f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FinPulse API cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--import-budget-ms", type=float, default=1000)
+    parser.add_argument("--first-request-budget-ms", type=float, default=250)
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child()
+
+    from suite import compare, git_revision
+
+    workdir = tempfile.mkdtemp(prefix="finpulse-startup-")
+    env = {
+        **os.environ,
+        "DATABASE_URL":   f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+        "SECRET_KEY":     os.getenv("SECRET_KEY", "benchmark-secret-key-benchmark-secret-key"),
+        "ALGORITHM":      os.getenv("ALGORITHM", "HS256"),
+        "GROQ_API_KEY":   os.getenv("GROQ_API_KEY", "benchmark"),
+        "LLM_CACHE_PATH": "",
+    }
+    subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=BACKEND,
+                             env=env, check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    print("[startup]")
+    results = [
+        summarize(name, [r[key] for r in runs])
+        for name, key in [
+            ("import main",        "import_ms"),
+            ("startup hook",       "startup_hook_ms"),
+            ("first request",      "first_request_ms"),
+            ("second request",     "next_request_ms"),
+            ("cold start total",   "cold_start_ms"),
+        ]
+    ]
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.utcnow().isoformat(),
+                "revision":  git_revision(),
+                "python":    platform.python_version(),
+                "platform":  platform.platform(),
+                "cpus":      os.cpu_count(),
+                "budgets":   {"import_ms": args.import_budget_ms,
+                              "first_request_ms": args.first_request_budget_ms},
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+    failures = []
+    import_p50 = statistics.median(r["import_ms"] for r in runs)
+    first_p50  = statistics.median(r["first_request_ms"] for r in runs)
+    if import_p50 > args.import_budget_ms:
+        failures.append(f"import main p50 {import_p50:.1f} ms > budget {args.import_budget_ms:.0f} ms")
+    if first_p50 > args.first_request_budget_ms:
+        failures.append(f"first request p50 {first_p50:.1f} ms > budget {args.first_request_budget_ms:.0f} ms")
+    loaded = sorted({m for r in runs for m in r["lazy_loaded"]})
+    if loaded:
+        failures.append(f"imported during startup: {', '.join(loaded)}")
+
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print("✅ within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+# ── Benchmark Suite ───────────────────────────────────────
+# Offline benchmarks for every engine.py stage and the hot API routes.
+# The LLM is replaced by an in-process stub and the API runs against a
+# throwaway SQLite database, so nothing leaves the machine.
+#
+#   python benchmarks/suite.py --sizes 10k,1m,10m --output bench.json
+#   python benchmarks/suite.py --only api --compare bench.json
+#
+# Every result is {"name", "size", "runs", "mean_ms", "p50_ms", "p95_ms",
+# "ops_per_sec"}; --compare prints the mean ratio against an earlier file.
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+def measure(name, size, fn, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    mean = statistics.fmean(timings)
+    result = {
+        "name":        name,
+        "size":        size,
+        "runs":        runs,
+        "mean_ms":     round(mean, 3),
+        "p50_ms":      round(timings[len(timings) // 2], 3),
+        "p95_ms":      round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "ops_per_sec": round(1000 / mean, 2) if mean else None,
+    }
+    print(f"  {name:<28} {size:>6}  mean {result['mean_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms")
+    return result
+
+
+def stub_llm():
+    import llm
+
+    class _Message:
+        content = json.dumps({"product": "cashback card", "persona": "spender", "confidence": 80})
+
+    class _Choice:
+        message = _Message()
+
+    class _Response:
+        choices = [_Choice()]
+
+    async def acreate(**kwargs):
+        return _Response()
+
+    llm.client.chat.completions.create       = lambda **kwargs: _Response()
+    llm.async_client.chat.completions.create = acreate
+
+
+def bench_engine(sizes, users, runs, workdir):
+    import engine
+    import synth
+    stub_llm()
+    engine.ACCOUNT_TO_USER.update(synth.account_map(users))
+
+    results = []
+    for label in sizes:
+        rows = SIZES[label]
+        path = os.path.join(workdir, f"transactions_{label}.csv")
+        print(f"[engine] generating {rows:,} rows for {users} users")
+        synth.write_transactions(path, users, rows)
+
+        def load():
+            engine._stores.pop(path, None)
+            engine.get_transaction_store(path).refresh()
+
+        load_runs = 1 if rows >= 1_000_000 else runs
+        results.append(measure("store.load", label, load, load_runs))
+
+        store   = engine.get_transaction_store(path)
+        user_id = store.user_ids()[0]
+        txns    = engine.load_user_transactions(user_id, path)
+        b       = engine.detect_behaviour(txns)
+        le      = engine.detect_life_event(b)
+        persona = engine.detect_persona(b, le)
+        product = engine.recommend_product(persona, le)
+
+        def rules():
+            life_event = engine.detect_life_event(b)
+            p          = engine.detect_persona(b, life_event)
+            pr         = engine.recommend_product(p, life_event)
+            engine.calculate_confidence(b, p, life_event)
+            engine.guardrail_check(p, b, pr)
+            engine.generate_reason(b, p, life_event)
+
+        # one-time per-user totals and daily buckets stay out of the timings
+        engine.analyze_user(user_id, path=path)
+        engine.analyze_user(user_id, window_days=30, path=path)
+
+        results += [
+            measure("load_user_transactions", label, lambda: engine.load_user_transactions(user_id, path), runs),
+            measure("detect_behaviour", label, lambda: engine.detect_behaviour(txns), runs),
+            measure("rules", label, rules, runs),
+            measure("generate_llm_message", label,
+                    lambda: engine.generate_llm_message(persona, product, "bench", use_cache=False), runs),
+            measure("analyze_user", label, lambda: engine.analyze_user(user_id, path=path), runs),
+            measure("analyze_user 30d", label,
+                    lambda: engine.analyze_user(user_id, window_days=30, path=path), runs),
+            measure("analyze_users", label, lambda: engine.analyze_users(path=path), max(1, runs // 5)),
+        ]
+        engine._stores.pop(path, None)
+        os.remove(path)
+    return results
+
+
+def bench_api(runs, audit_rows, workdir):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench_api.db')}"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    stub_llm()
+
+    from fastapi.testclient import TestClient
+    from database import SessionLocal, AuditLog
+    from audit_stats import rebuild_rollups
+    from migrate import migrate
+    import main
+
+    migrate()
+    results = []
+    with TestClient(main.app) as client:
+        db = SessionLocal()
+        db.bulk_save_objects([
+            AuditLog(employee_id="EMP000", customer_id=f"c{i}", product_recommended=f"product {i % 7}",
+                     persona="spender", guardrail="passed", timestamp=datetime(2026, 1, 1 + i % 28))
+            for i in range(audit_rows)
+        ])
+        db.commit()
+        db.close()
+        rebuild_rollups(SessionLocal())
+
+        login = {"employee_id": "EMP000", "password": "admin123"}
+        token = client.post("/auth/login", json=login).json()["access_token"]
+        auth  = {"Authorization": f"Bearer {token}"}
+
+        def post_ok(url, **kwargs):
+            response = client.post(url, **kwargs)
+            assert response.status_code == 200, response.text
+
+        counter = iter(range(10 ** 9))
+        results += [
+            measure("POST /auth/login", "api", lambda: post_ok("/auth/login", json=login), max(3, runs // 10)),
+            measure("POST /analyze-text", "api",
+                    lambda: post_ok("/analyze-text", json={"description": f"txn {next(counter)}"}, headers=auth), runs),
+            measure("GET /admin/product-stats", "api", lambda: client.get("/admin/product-stats"), runs),
+        ]
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(previous_path, results):
+    with open(previous_path) as f:
+        previous = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\ncompared with {previous_path} (new / old mean):")
+    for r in results:
+        old = previous.get((r["name"], r["size"]))
+        if old and old["mean_ms"]:
+            print(f"  {r['name']:<28} {r['size']:>6}  {r['mean_ms'] / old['mean_ms']:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline FinPulse benchmarks")
+    parser.add_argument("--sizes", default="10k,1m,10m", help=f"comma list from {list(SIZES)}")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--audit-rows", type=int, default=10_000)
+    parser.add_argument("--only", choices=["engine", "api"])
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    sizes   = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    workdir = tempfile.mkdtemp(prefix="finpulse-bench-")
+    os.environ.setdefault("LLM_CACHE_PATH", "")
+    # the LLM is stubbed, but the Groq clients still refuse to build without a key
+    os.environ.setdefault("GROQ_API_KEY", "bench-stub")
+    # streamed-event totals stay in process rather than in a configured database
+    os.environ.setdefault("LIVE_AGGREGATES", "memory")
+
+    results = []
+    if args.only in (None, "engine"):
+        results += bench_engine(sizes, args.users, args.runs, workdir)
+    if args.only in (None, "api"):
+        print("[api]")
+        results += bench_api(args.runs, args.audit_rows, workdir)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.utcnow().isoformat(),
+                "revision":  git_revision(),
+                "python":    platform.python_version(),
+                "platform":  platform.platform(),
+                "cpus":      os.cpu_count(),
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
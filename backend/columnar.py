@@ -0,0 +1,148 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for columnar transaction files
+    pa = pq = None
+
+# ── Columnar Transactions ─────────────────────────────────
+# Converts a transactions CSV into a compact, user-sorted columnar file that
+# TransactionStore reads instead of the CSV:
+#
+#   python columnar.py data/transactions.csv data/transactions.arrow
+#   export TRANSACTIONS_PATH=data/transactions.arrow
+#
+# Rows are stored already normalized (user_id and category mapped through
+# engine.ACCOUNT_TO_USER / CATEGORY_MAP at conversion time, unmapped accounts
+# dropped) and sorted by user_id. Repeated strings (user, account, category,
+# type, description) are dictionary-encoded, dates are date32 and amounts are
+# float32 whenever that round-trips to the cent.
+#
+# .arrow / .feather files are uncompressed Arrow IPC and are memory-mapped on
+# read, so numeric columns and dictionary indices are views over the page
+# cache and every uvicorn worker on the host shares the same pages.
+# .parquet files are smaller on disk but are decoded into each process.
+
+FORMAT_VERSION = "1"
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+PARQUET_SUFFIXES = (".parquet", ".pq")
+COLUMNS = ["user_id", "account_name", "date", "amount", "category", "type", "description"]
+
+CSV_DTYPES = {
+    "Account Name":     "category",
+    "Category":         "category",
+    "Transaction Type": "category",
+    "Description":      "category",
+}
+
+
+def is_columnar(path):
+    return str(path).lower().endswith(ARROW_SUFFIXES + PARQUET_SUFFIXES)
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow is required for columnar transaction files (pip install pyarrow)")
+
+
+def compact_amounts(amount):
+    # float32 keeps every cent exactly below 2**16; engine rounds back to cents
+    amount = np.asarray(amount, dtype=float)
+    if len(amount) and np.abs(amount).max() < 65536:
+        compact = amount.astype(np.float32)
+        if np.array_equal(np.round(compact.astype(float), 2), amount):
+            return compact
+    return amount
+
+
+def to_table(df):
+    # df is a prepared frame (engine.prepare_transactions) with user_id set
+    df = df[df["user_id"].notna()]
+    user_id = df["user_id"].astype("category")
+    user_id = user_id.cat.reorder_categories(sorted(user_id.cat.categories))
+    order = np.argsort(user_id.cat.codes.to_numpy(), kind="stable")
+    df, user_id = df.iloc[order], user_id.iloc[order]
+
+    day = pd.to_datetime(df["date"], errors="coerce").to_numpy().astype("datetime64[D]")
+    table = pa.table({
+        "user_id":      pa.array(user_id),
+        "account_name": pa.array(df["Account Name"].astype("category")),
+        "date":         pa.array(day, type=pa.date32()),
+        "amount":       pa.array(compact_amounts(df["amount"])),
+        "category":     pa.array(df["category"].astype("category")),
+        "type":         pa.array(df["type"].astype("category")),
+        "description":  pa.array(df["description"].astype("category")),
+    })
+    return table.replace_schema_metadata({"transactions.format": FORMAT_VERSION})
+
+
+def write_table(table, path):
+    require_pyarrow()
+    tmp = f"{path}.tmp"
+    if str(path).lower().endswith(PARQUET_SUFFIXES):
+        pq.write_table(table, tmp, compression="zstd")
+    else:
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read_table(path):
+    require_pyarrow()
+    if str(path).lower().endswith(PARQUET_SUFFIXES):
+        return pq.read_table(path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+def read_transactions(path, columns=None):
+    # TransactionStore frame: already normalized and sorted by user_id
+    table = read_table(path)
+    table = table.select(columns or [c for c in COLUMNS if c != "account_name"])
+    return table.to_pandas(split_blocks=True, date_as_object=False)
+
+
+def read_user_ids(path):
+    # sorted distinct user ids from the user_id column alone
+    table = read_table(path).select(["user_id"])
+    users = table.column("user_id").combine_chunks()
+    if pa.types.is_dictionary(users.type):
+        users = users.dictionary_decode()
+    return sorted(u for u in users.unique().to_pylist() if u is not None)
+
+
+def convert(csv_path, out_path):
+    require_pyarrow()
+    from engine import prepare_transactions
+
+    df = prepare_transactions(pd.read_csv(csv_path, dtype=CSV_DTYPES))
+    table = to_table(df)
+    write_table(table, out_path)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a transactions CSV to a columnar file.")
+    parser.add_argument("input", help="transactions CSV")
+    parser.add_argument("output", help="output path (.arrow/.feather for memory-mapped, .parquet)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    table = convert(args.input, args.output)
+    elapsed = time.perf_counter() - started
+
+    users = len(table.column("user_id").combine_chunks().dictionary)
+    print(f"Wrote {table.num_rows:,} rows for {users:,} users to {args.output} "
+          f"({os.path.getsize(args.output) / 1e6:.1f} MB, {table.nbytes / 1e6:.1f} MB in memory) "
+          f"in {elapsed:.1f}s", file=sys.stderr)
+    print(f"Amount dtype: {table.schema.field('amount').type}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime
+from sqlalchemy import create_engine, inspect, Column, String, Integer, Float, DateTime, Date, UniqueConstraint, Index
 from sqlalchemy.orm import declarative_base, sessionmaker
 from datetime import datetime
 import os
@@ -50,6 +50,12 @@ class User(Base):
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("ix_audit_logs_customer_ts", "customer_id", "timestamp"),
+        Index("ix_audit_logs_employee_ts", "employee_id", "timestamp"),
+        Index("ix_audit_logs_product_ts", "product_recommended", "timestamp"),
+        Index("ix_audit_logs_ts_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     employee_id = Column(String, nullable=False)
@@ -66,6 +72,57 @@ class AuditLog(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
 
+class AuditRollup(Base):
+    __tablename__ = "audit_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "product", "persona", "guardrail", name="uq_audit_rollups_key"),
+    )
+
+    # one row per (day, product, persona, guardrail), maintained by audit_stats
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False, index=True)
+    product = Column(String, nullable=False, default="")
+    persona = Column(String, nullable=False, default="")
+    guardrail = Column(String, nullable=False, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+
+class LiveTotal(Base):
+    __tablename__ = "live_totals"
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", name="uq_live_totals_user_day"),
+    )
+
+    # one row per (user_id, day) of streamed transactions, maintained by
+    # live_totals; columns mirror engine.BUCKET_COLUMNS
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    food_count = Column(Integer, nullable=False, default=0)
+    travel_count = Column(Integer, nullable=False, default=0)
+    salary_count = Column(Integer, nullable=False, default=0)
+    education_count = Column(Integer, nullable=False, default=0)
+    rent_count = Column(Integer, nullable=False, default=0)
+    shopping_count = Column(Integer, nullable=False, default=0)
+    entertainment_count = Column(Integer, nullable=False, default=0)
+    total_income = Column(Float, nullable=False, default=0.0)
+    total_spent = Column(Float, nullable=False, default=0.0)
+
+
+class EmailJobRecord(Base):
+    __tablename__ = "email_jobs"
+
+    # progress counters of a mailer job, shared by all workers
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False, default="campaign")
+    total = Column(Integer, nullable=False)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(String)
+    created = Column(DateTime, default=datetime.utcnow)
+    finished = Column(DateTime)
+
+
 # =========================
 # DB Dependency
 # =========================
@@ -83,4 +140,16 @@ def get_db():
 # =========================
 
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+
+    # create_all only indexes tables it creates; add any missing indexes to
+    # tables that already existed
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def missing_tables():
+    # model tables the database does not have yet (one catalog query)
+    existing = set(inspect(engine).get_table_names())
+    return [name for name in Base.metadata.tables if name not in existing]
@@ -0,0 +1,116 @@
+import os
+import threading
+from sqlalchemy import text
+from database import engine
+
+# ── Employee ID Allocation ────────────────────────────────
+# Signups draw EMPxxx numbers from a database sequence on PostgreSQL, or
+# otherwise reserve EMPLOYEE_ID_BLOCK numbers at a time from a counter row
+# and hand them out in-process. Either way concurrent signups, across
+# threads and workers, never compute the same ID.
+
+EMPLOYEE_ID_BLOCK = int(os.getenv("EMPLOYEE_ID_BLOCK", "50"))
+SEQUENCE_NAME     = "employee_id_seq"
+COUNTER_NAME      = "employee_id"
+
+
+def format_employee_id(number: int) -> str:
+    return f"EMP{number:03d}"
+
+
+def highest_employee_number(conn) -> int:
+    highest = 0
+    for (employee_id,) in conn.execute(text(
+        "SELECT employee_id FROM users WHERE employee_id LIKE 'EMP%'"
+    )):
+        try:
+            highest = max(highest, int(employee_id[3:]))
+        except ValueError:
+            pass
+    return highest
+
+
+class EmployeeIdAllocator:
+
+    def __init__(self, bind=engine, block_size=EMPLOYEE_ID_BLOCK):
+        self.bind       = bind
+        self.block_size = block_size
+        self._lock      = threading.Lock()
+        self._ready     = False
+        self._next      = 0
+        self._limit     = 0
+
+    @property
+    def uses_sequence(self):
+        return self.bind.dialect.name == "postgresql"
+
+    def ensure(self):
+        # Create the sequence / counter row and move it past existing IDs.
+        with self.bind.begin() as conn:
+            floor = highest_employee_number(conn) + 1
+            if self.uses_sequence:
+                conn.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE_NAME}"))
+                last_value, is_called = conn.execute(
+                    text(f"SELECT last_value, is_called FROM {SEQUENCE_NAME}")
+                ).one()
+                upcoming = last_value + 1 if is_called else last_value
+                if floor > upcoming:
+                    conn.execute(text(f"SELECT setval('{SEQUENCE_NAME}', :v, false)"), {"v": floor})
+            else:
+                conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS id_counters ("
+                    " name VARCHAR PRIMARY KEY,"
+                    " next_value INTEGER NOT NULL)"
+                ))
+                # UPDATE first so the write lock is held before the existence check
+                conn.execute(
+                    text("UPDATE id_counters SET next_value = :v WHERE name = :n AND next_value < :v"),
+                    {"n": COUNTER_NAME, "v": floor}
+                )
+                exists = conn.execute(
+                    text("SELECT 1 FROM id_counters WHERE name = :n"), {"n": COUNTER_NAME}
+                ).scalar()
+                if not exists:
+                    conn.execute(
+                        text("INSERT INTO id_counters (name, next_value) VALUES (:n, :v)"),
+                        {"n": COUNTER_NAME, "v": floor}
+                    )
+        self._ready = True
+
+    def _reserve_block(self):
+        # The UPDATE takes the row's write lock before the read, so two
+        # workers can never be handed overlapping blocks.
+        with self.bind.begin() as conn:
+            conn.execute(
+                text("UPDATE id_counters SET next_value = next_value + :b WHERE name = :n"),
+                {"n": COUNTER_NAME, "b": self.block_size}
+            )
+            end = conn.execute(
+                text("SELECT next_value FROM id_counters WHERE name = :n"), {"n": COUNTER_NAME}
+            ).scalar()
+        self._next  = end - self.block_size
+        self._limit = end
+
+    def next_number(self) -> int:
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self.ensure()
+        if self.uses_sequence:
+            # nextval is atomic in the database, so concurrent signups in
+            # this process do not queue behind each other's round trip
+            with self.bind.connect() as conn:
+                return conn.execute(text(f"SELECT nextval('{SEQUENCE_NAME}')")).scalar()
+        # only the in-process block needs the lock
+        with self._lock:
+            if self._next >= self._limit:
+                self._reserve_block()
+            number = self._next
+            self._next += 1
+            return number
+
+    def next_id(self) -> str:
+        return format_employee_id(self.next_number())
+
+
+employee_ids = EmployeeIdAllocator()
@@ -1,13 +1,38 @@
-import pandas as pd
+import asyncio
+import importlib
 import os
+import json
+import threading
 from dotenv import load_dotenv
-from groq import Groq
+from starlette.concurrency import run_in_threadpool
+import llm
+from llm_cache import get_message_cache, make_key
+from metrics import STAGE_SECONDS, LLM_FALLBACKS
+from message_bank import MessageBank, MessageEnricher
+
+# pandas, numpy, pyarrow (columnar.py) and the compiled rule table load on
+# first use, like the Groq clients in llm.py, so importing engine costs a
+# serverless cold start nothing until a route actually scores.
+class _LazyModule:
+    def __init__(self, name):
+        self._name   = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+pd = _LazyModule("pandas")
+np = _LazyModule("numpy")
 
 # Load environment variables from .env file
 load_dotenv()
 
 # ── Config ────────────────────────────────────────────────
 USE_DATABASE = False  # flip to True if adding PostgreSQL later
+TRANSACTIONS_PATH = os.getenv("TRANSACTIONS_PATH", "data/transactions.csv")
 
 ACCOUNT_TO_USER = {
     "Platinum Card": "user_001",
@@ -15,6 +40,13 @@ ACCOUNT_TO_USER = {
     "Checking":      "user_003"
 }
 
+# Extra account → user mappings (e.g. from synth.py) can be supplied as a
+# JSON object in the file named by ACCOUNT_MAP_PATH.
+ACCOUNT_MAP_PATH = os.getenv("ACCOUNT_MAP_PATH")
+if ACCOUNT_MAP_PATH:
+    with open(ACCOUNT_MAP_PATH) as f:
+        ACCOUNT_TO_USER.update(json.load(f))
+
 CATEGORY_MAP = {
     "Restaurants":          "Food",
     "Fast Food":            "Food",
@@ -34,171 +66,523 @@ CATEGORY_MAP = {
     "Transfer":             "Transfer"
 }
 
-# Set the API key variable globally from the environment
-GROQ_KEY = os.getenv("GROQ_API_KEY")
+# detect_behaviour counts these CATEGORY_MAP values
+BEHAVIOUR_CATEGORIES = {
+    "food_count":          "Food",
+    "travel_count":        "Travel",
+    "salary_count":        "Salary",
+    "education_count":     "Education",
+    "rent_count":          "Rent",
+    "shopping_count":      "Shopping",
+    "entertainment_count": "Entertainment",
+}
 
-# Initialize the Groq client globally using that key
-client = Groq(api_key=GROQ_KEY)
+# Groq clients are shared with the API via llm.py and built on first use
+GROQ_KEY = llm.GROQ_KEY
+
+def __getattr__(name):
+    if name == "client":
+        return llm.get_client()
+    if name == "ruleset":
+        return get_ruleset()
+    if name == "message_bank":
+        return get_message_bank()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ── Transaction Store ─────────────────────────────────────
+# Parses the CSV once, keeps rows sorted by user_id and remembers each user's
+# row range, so a lookup only touches that user's rows. The file is re-read
+# when its mtime or size changes. Columnar files written by columnar.py are
+# already normalized and sorted and are memory-mapped instead of parsed.
+TRANSACTION_COLUMNS = ["user_id", "date", "amount", "category", "type", "description"]
+
+def prepare_transactions(df):
+    df["user_id"]  = df["Account Name"].map(ACCOUNT_TO_USER)
+    df["category"] = df["Category"].map(CATEGORY_MAP).fillna("Other")
+    df = df.rename(columns={
+        "Date":             "date",
+        "Amount":           "amount",
+        "Transaction Type": "type",
+        "Description":      "description"
+    })
+    return df
+
+def transaction_amounts(frame):
+    # columnar files may hold float32 amounts; those round back to the cent
+    amount = frame["amount"].to_numpy()
+    if amount.dtype == np.float32:
+        return np.round(amount.astype(float), 2)
+    return amount.astype(float)
+
+def user_spans(users):
+    # {user_id: (start, stop)} over a column already sorted by user_id
+    if isinstance(users.dtype, pd.CategoricalDtype):
+        codes  = users.cat.codes.to_numpy()
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+        keys   = users.cat.categories[codes[starts]]
+    else:
+        keys, starts = np.unique(users.to_numpy(), return_index=True)
+    stops = np.append(starts[1:], len(users))
+    return {u: (int(a), int(b)) for u, a, b in zip(keys, starts, stops)}
+
+# Daily per-user buckets of the counts and sums detect_behaviour needs, with
+# running totals, so any date window is two binary searches and one
+# subtraction per user instead of a rescan of that user's rows.
+BUCKET_COLUMNS = [*BEHAVIOUR_CATEGORIES, "total_income", "total_spent"]
+
+class DailyBuckets:
+    def __init__(self, frame):
+        day      = pd.to_datetime(frame["date"], errors="coerce").dt.normalize()
+        category = frame["category"]
+        kind     = frame["type"]
+        amount   = transaction_amounts(frame)
+
+        keyed = pd.DataFrame({"user_id": frame["user_id"].to_numpy(dtype=object), "day": day.to_numpy()})
+        for column, value in BEHAVIOUR_CATEGORIES.items():
+            keyed[column] = (category == value).to_numpy().astype(np.int64)
+        keyed["total_income"] = np.where((kind == "credit").to_numpy(), amount, 0.0)
+        keyed["total_spent"]  = np.where((kind == "debit").to_numpy(), amount, 0.0)
+
+        self.buckets = keyed.dropna(subset=["day"]).groupby(["user_id", "day"], sort=True).sum()
+
+        users     = self.buckets.index.get_level_values(0).to_numpy()
+        self.days = self.buckets.index.get_level_values(1).to_numpy().astype("datetime64[D]")
+        values    = self.buckets[BUCKET_COLUMNS].to_numpy(dtype=float)
+        self.cumulative = np.vstack([np.zeros((1, len(BUCKET_COLUMNS))), np.cumsum(values, axis=0)])
+
+        keys, starts = np.unique(users, return_index=True)
+        stops        = np.append(starts[1:], len(users))
+        self.index   = {u: (int(a), int(b)) for u, a, b in zip(keys, starts, stops)}
+        self.latest  = self.days.max() if len(self.days) else None
+
+    def _bounds(self, days, as_of):
+        as_of = np.datetime64(as_of, "D") if as_of is not None else self.latest
+        start = as_of - np.timedelta64(days, "D") if days is not None else None
+        return start, as_of
+
+    def totals(self, user_id, days=None, as_of=None):
+        # sums over (as_of - days, as_of]; as_of defaults to the newest day
+        span = self.index.get(user_id)
+        if span is None:
+            return None
+        start, end = self._bounds(days, as_of)
+        a, b       = span
+        user_days  = self.days[a:b]
+        i = a if start is None else a + int(np.searchsorted(user_days, start, side="right"))
+        j = a + int(np.searchsorted(user_days, end, side="right"))
+        return dict(zip(BUCKET_COLUMNS, (self.cumulative[j] - self.cumulative[i]).tolist()))
+
+    def window_frame(self, days=None, as_of=None, user_ids=None):
+        start, end = self._bounds(days, as_of)
+        day        = self.buckets.index.get_level_values(1)
+        mask       = day <= pd.Timestamp(end)
+        if start is not None:
+            mask &= day > pd.Timestamp(start)
+        users  = pd.Index(list(self.index) if user_ids is None else
+                          [u for u in dict.fromkeys(user_ids) if u in self.index], name="user_id")
+        totals = self.buckets[mask].groupby(level=0).sum().reindex(users, fill_value=0)
+        return totals[BUCKET_COLUMNS]
+
+class TransactionStore:
+    def __init__(self, path):
+        self.path       = path
+        self._lock      = threading.Lock()
+        self._signature = None
+        self._state     = (pd.DataFrame(columns=TRANSACTION_COLUMNS), {})
+        self._buckets   = None
+        self._totals    = None
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        import columnar
+        if columnar.is_columnar(self.path):
+            df = columnar.read_transactions(self.path, TRANSACTION_COLUMNS)
+            return df, user_spans(df["user_id"])
+
+        df = prepare_transactions(pd.read_csv(self.path))
+        df = df[df["user_id"].notna()]
+        df = df.sort_values("user_id", kind="stable").reset_index(drop=True)
+        return df[TRANSACTION_COLUMNS], user_spans(df["user_id"])
+
+    def refresh(self):
+        signature = self._stat()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature != self._signature:
+                self._state     = self._load()
+                self._buckets   = None
+                self._totals    = None
+                self._signature = signature
+
+    def frame(self):
+        self.refresh()
+        return self._state[0]
+
+    def user_ids(self):
+        self.refresh()
+        return list(self._state[1])
+
+    def get(self, user_id):
+        self.refresh()
+        frame, index = self._state
+        span = index.get(user_id)
+        if span is None:
+            return []
+        rows = frame.iloc[span[0]:span[1]]
+        if pd.api.types.is_datetime64_any_dtype(rows["date"]):
+            # columnar rows: date32 and possibly float32 amounts
+            rows = rows.assign(date=rows["date"].dt.strftime("%Y-%m-%d"),
+                               amount=transaction_amounts(rows))
+        return rows.to_dict(orient="records")
+
+    def frame_for(self, user_ids):
+        self.refresh()
+        frame, index = self._state
+        spans = [index[u] for u in dict.fromkeys(user_ids) if u in index]
+        if not spans:
+            return frame.iloc[0:0]
+        return frame.iloc[np.concatenate([np.arange(a, b) for a, b in spans])]
+
+    def buckets(self):
+        # built on first use, rebuilt after a reload
+        self.refresh()
+        buckets = self._buckets
+        if buckets is None:
+            with self._lock:
+                if self._buckets is None:
+                    self._buckets = DailyBuckets(self._state[0])
+                buckets = self._buckets
+        return buckets
+
+    def _user_totals(self):
+        # full-history totals per user (BUCKET_COLUMNS), built on first use,
+        # as a frame for batch scoring and a dict for O(1) lookups
+        self.refresh()
+        totals = self._totals
+        if totals is None:
+            with self._lock:
+                if self._totals is None:
+                    frame = behaviour_totals(self._state[0])
+                    self._totals = (frame, dict(zip(frame.index, frame.to_numpy().tolist())))
+                totals = self._totals
+        return totals
+
+    def totals_frame(self):
+        return self._user_totals()[0]
+
+    def totals_for(self, user_ids):
+        # totals for just these users: a slice of the portfolio totals once
+        # they are built, otherwise aggregated from these users' rows only
+        self.refresh()
+        totals = self._totals
+        if totals is not None:
+            frame = totals[0]
+            return frame.reindex([u for u in dict.fromkeys(user_ids) if u in frame.index])
+        return behaviour_totals(self.frame_for(user_ids))
+
+    def row_count(self, user_ids):
+        self.refresh()
+        index = self._state[1]
+        return sum(b - a for a, b in (index[u] for u in dict.fromkeys(user_ids) if u in index))
+
+    def totals(self, user_id):
+        values = self._user_totals()[1].get(user_id)
+        return None if values is None else dict(zip(BUCKET_COLUMNS, values))
+
+_stores      = {}
+_stores_lock = threading.Lock()
+
+def get_transaction_store(path=None):
+    path = path or TRANSACTIONS_PATH
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = TransactionStore(path)
+        return _stores[path]
 
 # ── Function 1: Load Data ─────────────────────────────────
-def load_user_transactions(user_id: str):
+def load_user_transactions(user_id: str, path=None):
     try:
-        df = pd.read_csv("data/transactions.csv")
-
-        df["user_id"]  = df["Account Name"].map(ACCOUNT_TO_USER)
-        df["category"] = df["Category"].map(CATEGORY_MAP).fillna("Other")
-        df = df.rename(columns={
-            "Date":             "date",
-            "Amount":           "amount",
-            "Transaction Type": "type",
-            "Description":      "description"
-        })
-
-        user_df = df[df["user_id"] == user_id]
-
-        if user_df.empty:
-            return []
-
-        return user_df[["user_id", "date", "amount", "category", "type", "description"]].to_dict(orient="records")
+        return get_transaction_store(path).get(user_id)
     except FileNotFoundError:
-        print("Error: data/transactions.csv not found.")
+        print(f"Error: {path or TRANSACTIONS_PATH} not found.")
         return []
 
 # ── Function 2: Behaviour Detection ──────────────────────
-def detect_behaviour(transactions):
-    food          = sum(1 for t in transactions if t["category"] == "Food")
-    travel        = sum(1 for t in transactions if t["category"] == "Travel")
-    salary        = sum(1 for t in transactions if t["category"] == "Salary")
-    education     = sum(1 for t in transactions if t["category"] == "Education")
-    rent          = sum(1 for t in transactions if t["category"] == "Rent")
-    shopping      = sum(1 for t in transactions if t["category"] == "Shopping")
-    entertainment = sum(1 for t in transactions if t["category"] == "Entertainment")
-
-    credits  = [t["amount"] for t in transactions if t["type"] == "credit"]
-    debits   = [t["amount"] for t in transactions if t["type"] == "debit"]
-
-    total_spent  = sum(debits)
-    total_income = sum(credits)
-    low_balance  = (total_income - total_spent) < 500
-
+def behaviour_from_totals(totals):
+    food   = int(round(totals["food_count"]))
+    travel = int(round(totals["travel_count"]))
     return {
         "food_count":           food,
         "travel_count":         travel,
-        "salary_detected":      salary > 0,
-        "education_count":      education,
-        "rent_count":           rent,
-        "shopping_count":       shopping,
-        "entertainment_count":  entertainment,
-        "total_spent":          round(total_spent, 2),
-        "total_income":         round(total_income, 2),
-        "low_balance":          low_balance,
+        "salary_detected":      bool(totals["salary_count"] > 0),
+        "education_count":      int(round(totals["education_count"])),
+        "rent_count":           int(round(totals["rent_count"])),
+        "shopping_count":       int(round(totals["shopping_count"])),
+        "entertainment_count":  int(round(totals["entertainment_count"])),
+        "total_spent":          round(totals["total_spent"], 2),
+        "total_income":         round(totals["total_income"], 2),
+        "low_balance":          bool((totals["total_income"] - totals["total_spent"]) < 500),
         "food_spending":        "high" if food > 5 else "low",
         "is_traveler":          travel > 3,
     }
 
+def detect_behaviour(transactions):
+    totals = {
+        column: sum(1 for t in transactions if t["category"] == category)
+        for column, category in BEHAVIOUR_CATEGORIES.items()
+    }
+    totals["total_income"] = sum(t["amount"] for t in transactions if t["type"] == "credit")
+    totals["total_spent"]  = sum(t["amount"] for t in transactions if t["type"] == "debit")
+    return behaviour_from_totals(totals)
+
+# Behaviour over the last `days` days up to `as_of` (default: the newest
+# transaction seen), from the store's daily buckets plus live events.
+# Returns None for an unknown user.
+BEHAVIOUR_WINDOWS = (30, 90, 365)
+
+def detect_behaviour_window(user_id, days, as_of=None, path=None):
+    totals = user_totals(user_id, days, as_of, path)
+    return None if totals is None else behaviour_from_totals(totals)
+
+def behaviour_windows(user_id, windows=BEHAVIOUR_WINDOWS, as_of=None, path=None):
+    windows = {f"{d}d": detect_behaviour_window(user_id, d, as_of, path) for d in windows}
+    return {} if any(b is None for b in windows.values()) else windows
+
+# ── Live Aggregates ───────────────────────────────────────
+# Transactions ingested through ingest_transactions (or POST /transactions)
+# update per-user running totals, and per-day totals for windows, in O(1)
+# per event. Scoring reads file totals + live totals, so a score reflects
+# a new swipe immediately without touching raw rows; call
+# reset_live_aggregates() once the events have been folded into the file.
+#
+# With a database configured (LIVE_AGGREGATES=db, the default when
+# DATABASE_URL is set) the totals live in the shared live_totals table
+# (live_totals.py), so every worker sees every event. LIVE_AGGREGATES=memory
+# keeps them in this process only, appended to INGEST_JOURNAL_PATH when set
+# and replayed on start; that mode is for single-process use (CLI, scripts),
+# and the API refuses to start with it under several workers.
+INGEST_JOURNAL_PATH = os.getenv("INGEST_JOURNAL_PATH")
+LIVE_AGGREGATES     = os.getenv("LIVE_AGGREGATES", "db" if os.getenv("DATABASE_URL") else "memory")
+
+_NORMALIZED_CATEGORIES = set(CATEGORY_MAP.values()) | {"Other"}
+_CATEGORY_COLUMN       = {category: i for i, category in enumerate(BEHAVIOUR_CATEGORIES.values())}
+_INCOME                = BUCKET_COLUMNS.index("total_income")
+_SPENT                 = BUCKET_COLUMNS.index("total_spent")
+
+def normalize_event(event):
+    user_id = event.get("user_id") or ACCOUNT_TO_USER.get(event.get("account_name"))
+    if not user_id:
+        raise ValueError("transaction needs a user_id or a known account_name")
+
+    category = event.get("category") or "Other"
+    category = CATEGORY_MAP.get(category, category if category in _NORMALIZED_CATEGORIES else "Other")
+
+    kind = str(event.get("type") or "").lower()
+    if kind not in ("credit", "debit"):
+        raise ValueError(f"transaction type must be credit or debit, got {event.get('type')!r}")
+
+    date = event.get("date")
+    day  = np.datetime64(pd.Timestamp(date).date() if date else pd.Timestamp.utcnow().date(), "D")
+    return user_id, category, kind, float(event["amount"]), day
+
+class LiveAggregates:
+    def __init__(self, journal_path=None):
+        self.journal_path = journal_path
+        self._lock        = threading.Lock()
+        self._totals      = {}
+        self._days        = {}
+        self.latest       = None
+        self.events       = 0
+
+        if journal_path and os.path.exists(journal_path):
+            with open(journal_path) as f:
+                for line in f:
+                    if line.strip():
+                        user_id, category, kind, amount, day = json.loads(line)
+                        self._apply(user_id, category, kind, amount, np.datetime64(day, "D"))
+
+    def _apply(self, user_id, category, kind, amount, day):
+        totals = self._totals.get(user_id)
+        if totals is None:
+            totals = self._totals[user_id] = [0.0] * len(BUCKET_COLUMNS)
+            self._days[user_id] = {}
+        daily = self._days[user_id].get(day)
+        if daily is None:
+            daily = self._days[user_id][day] = [0.0] * len(BUCKET_COLUMNS)
+
+        column = _CATEGORY_COLUMN.get(category)
+        if column is not None:
+            totals[column] += 1
+            daily[column]  += 1
+        if kind == "credit":
+            totals[_INCOME] += amount
+            daily[_INCOME]  += amount
+        else:
+            totals[_SPENT] += amount
+            daily[_SPENT]  += amount
+
+        if self.latest is None or day > self.latest:
+            self.latest = day
+        self.events += 1
+
+    def ingest(self, events):
+        with self._lock:
+            if self.journal_path:
+                with open(self.journal_path, "a") as f:
+                    for user_id, category, kind, amount, day in events:
+                        f.write(json.dumps([user_id, category, kind, amount, str(day)]) + "\n")
+            for event in events:
+                self._apply(*event)
+        return len(events)
+
+    def totals(self, user_id, start=None, end=None):
+        # whole stream when start/end are None, else days in (start, end]
+        with self._lock:
+            if user_id not in self._totals:
+                return None
+            if start is None and end is None:
+                return list(self._totals[user_id])
+            out = [0.0] * len(BUCKET_COLUMNS)
+            for day, daily in self._days[user_id].items():
+                if (start is None or day > start) and (end is None or day <= end):
+                    out = [a + b for a, b in zip(out, daily)]
+            return out
+
+    def frame(self, start=None, end=None):
+        users = list(self._totals)
+        rows  = [self.totals(u, start, end) for u in users]
+        return pd.DataFrame(rows, index=pd.Index(users, name="user_id"), columns=BUCKET_COLUMNS, dtype=float)
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self._days.clear()
+            self.latest = None
+            self.events = 0
+            if self.journal_path and os.path.exists(self.journal_path):
+                open(self.journal_path, "w").close()
+
+_live      = None
+_live_lock = threading.Lock()
+
+def get_live_aggregates():
+    global _live
+    if _live is None:
+        with _live_lock:
+            if _live is None and LIVE_AGGREGATES == "db":
+                from live_totals import LiveTotals
+                _live = LiveTotals(BUCKET_COLUMNS, _CATEGORY_COLUMN)
+            elif _live is None:
+                _live = LiveAggregates(INGEST_JOURNAL_PATH)
+    return _live
+
+def ingest_transactions(events):
+    # validates every event before applying any; returns the affected users
+    normalized = [normalize_event(e) for e in events]
+    get_live_aggregates().ingest(normalized)
+    return list(dict.fromkeys(e[0] for e in normalized))
+
+def reset_live_aggregates():
+    get_live_aggregates().reset()
+
+def _window_bounds(days, as_of, *latest):
+    if as_of is not None:
+        end = np.datetime64(as_of, "D")
+    else:
+        known = [d for d in latest if d is not None]
+        end   = max(known) if known else np.datetime64(pd.Timestamp.utcnow().date(), "D")
+    return end - np.timedelta64(days, "D"), end
+
+def user_totals(user_id, days=None, as_of=None, path=None):
+    # file totals + live totals for one user, over full history or a window
+    live = get_live_aggregates()
+    try:
+        store = get_transaction_store(path)
+        if days is None:
+            stored = store.totals(user_id)
+        else:
+            buckets    = store.buckets()
+            start, end = _window_bounds(days, as_of, buckets.latest, live.latest)
+            stored     = buckets.totals(user_id, days, end)
+    except FileNotFoundError:
+        print(f"Error: {path or TRANSACTIONS_PATH} not found.")
+        stored = None
+        if days is not None:
+            start, end = _window_bounds(days, as_of, live.latest)
+
+    streamed = live.totals(user_id) if days is None else live.totals(user_id, start, end)
+
+    if stored is None and streamed is None:
+        return None
+    if streamed is None:
+        return stored
+    if stored is None:
+        return dict(zip(BUCKET_COLUMNS, streamed))
+    return {column: stored[column] + extra for column, extra in zip(BUCKET_COLUMNS, streamed)}
+
+# ── Rules ─────────────────────────────────────────────────
+# Functions 3-8 evaluate the compiled rule table from rules.py (override
+# with RULES_PATH); batch scoring evaluates the same RuleSet column-wise.
+# Both are built on first use; engine.ruleset / engine.message_bank still
+# resolve through __getattr__ above.
+_ruleset      = None
+_message_bank = None
+_rules_lock   = threading.Lock()
+
+def get_ruleset():
+    if _ruleset is None:
+        with _rules_lock:
+            if _ruleset is None:
+                reload_rules()
+    return _ruleset
+
+def get_message_bank():
+    get_ruleset()
+    return _message_bank
+
+def reload_rules(path=None):
+    global _ruleset, _message_bank
+    from rules import load_ruleset
+    ruleset       = load_ruleset(path)
+    _message_bank = MessageBank(ruleset)
+    _ruleset      = ruleset
+    return ruleset.version
+
 # ── Function 3: Life Event Detection ─────────────────────
 def detect_life_event(behaviour):
-    if behaviour["education_count"] >= 2:
-        return "higher_education"
-    if behaviour["is_traveler"]:
-        return "frequent_traveler"
-    if behaviour["rent_count"] >= 2:
-        return "renter"
-    if behaviour["salary_detected"]:
-        return "employed"
-    return "unknown"
+    return get_ruleset().first_match("life_event", behaviour)
 
 # ── Function 4: Persona Creation ─────────────────────────
 def detect_persona(behaviour, life_event):
-    if life_event == "higher_education":
-        return "student"
-    if behaviour["low_balance"] and behaviour["salary_detected"]:
-        return "credit_dependent"
-    if behaviour["food_spending"] == "high" or behaviour["is_traveler"] or behaviour["shopping_count"] > 5:
-        return "spender"
-    if not behaviour["low_balance"] and behaviour["salary_detected"]:
-        return "saver"
-    return "general"
+    return get_ruleset().first_match("persona", {**behaviour, "life_event": life_event})
 
 # ── Function 5: Product Recommendation ───────────────────
 def recommend_product(persona, life_event):
-    if life_event == "frequent_traveler":
-        return "travel card"
-    mapping = {
-        "spender":          "cashback card",
-        "student":          "education loan",
-        "credit_dependent": "overdraft protection",
-        "saver":            "SIP investment",
-        "general":          "basic savings account"
-    }
-    return mapping.get(persona, "basic savings account")
+    return get_ruleset().first_match("product", {"persona": persona, "life_event": life_event})
 
 # ── Function 6: Confidence Score ─────────────────────────
 def calculate_confidence(behaviour, persona, life_event):
-    score = 0
-    if behaviour["salary_detected"]:         score += 30
-    if behaviour["food_count"] > 10:         score += 40
-    elif behaviour["food_count"] > 5:        score += 20
-    if behaviour["is_traveler"]:             score += 20
-    if behaviour["education_count"] >= 2:    score += 30
-    if behaviour["rent_count"] >= 2:         score += 20
-    if behaviour["shopping_count"] > 5:      score += 15
-    if life_event != "unknown":              score += 20
-    if persona != "general":                score += 10
-    return min(score, 100)
+    return get_ruleset().confidence({**behaviour, "persona": persona, "life_event": life_event})
 
 # ── Function 7: Guardrail Safety Check ───────────────────
 def guardrail_check(persona, behaviour, product):
-    blocked       = False
-    reason        = "all checks passed"
-    final_product = product
-
-    if behaviour["low_balance"] and product in ["education loan", "overdraft protection"]:
-        blocked       = True
-        final_product = "basic savings account"
-        reason        = "blocked: low balance — safer product assigned"
-
-    if product == "travel card" and not behaviour["is_traveler"]:
-        blocked       = True
-        final_product = "cashback card"
-        reason        = "blocked: travel card not suitable — cashback assigned"
-
-    if product == "SIP investment" and behaviour["low_balance"]:
-        blocked       = True
-        final_product = "recurring deposit"
-        reason        = "blocked: low balance — recurring deposit suggested instead"
-
-    return {
-        "guardrail":        "blocked" if blocked else "passed",
-        "guardrail_reason": reason,
-        "final_product":    final_product
-    }
+    return get_ruleset().guardrail({**behaviour, "persona": persona, "product": product})
 
 # ── Function 8: Generate Reason ──────────────────────────
 def generate_reason(behaviour, persona, life_event):
-    parts = []
-    if behaviour["food_count"] > 5:
-        parts.append(f"frequent food transactions ({behaviour['food_count']} times)")
-    if behaviour["is_traveler"]:
-        parts.append(f"travel spending detected ({behaviour['travel_count']} trips)")
-    if behaviour["education_count"] >= 2:
-        parts.append(f"education payments found ({behaviour['education_count']} times)")
-    if behaviour["low_balance"]:
-        parts.append("low balance detected")
-    if behaviour["salary_detected"]:
-        parts.append("regular salary income confirmed")
-    if behaviour["shopping_count"] > 5:
-        parts.append(f"high shopping activity ({behaviour['shopping_count']} transactions)")
-    if behaviour["rent_count"] >= 2:
-        parts.append(f"regular rent payments ({behaviour['rent_count']} times)")
-
-    reason = ", ".join(parts) if parts else "general spending pattern observed"
-    return f"User identified as {persona} due to: {reason}."
+    return get_ruleset().reason({**behaviour, "persona": persona, "life_event": life_event})
 
 # ── Function 9: LLM Personalised Message (FIXED) ─────────
-def generate_llm_message(persona, product, reason):
-    try:
-        prompt = f"""
+# Successful completions are cached on the normalized (persona, product,
+# reason) inputs; the template fallback is never cached.
+LLM_MODEL = llm.LLM_MODEL
+
+def message_prompt(persona, product, reason):
+    return f"""
         You are a warm friendly bank assistant.
         Customer type: {persona}
         Recommended product: {product}
@@ -206,31 +590,227 @@ def generate_llm_message(persona, product, reason):
         Write a short 2 line personalised message recommending 
         this product. Be friendly and specific, not robotic.
         """
-        # Using the global 'client' which was initialized with the GROQ_KEY
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}]
+
+def fallback_message(product):
+    return f"Based on your profile, we recommend our {product} — perfectly suited for your lifestyle."
+
+def generate_llm_message(persona, product, reason, use_cache=True):
+    cache = get_message_cache() if use_cache else None
+    key   = make_key(LLM_MODEL, persona, product, reason)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    try:
+        message = llm.complete(
+            [{"role": "user", "content": message_prompt(persona, product, reason)}],
+            model=LLM_MODEL
         )
-        return response.choices[0].message.content
+        if cache is not None:
+            cache.set(key, message)
+        return message
     except Exception as e:
         print(f"GROQ ERROR: {e}")
-        return f"Based on your profile, we recommend our {product} — perfectly suited for your lifestyle."
-
-# ── Function 10: Master analyze_user Function ─────────────
-def analyze_user(user_id: str):
-    transactions = load_user_transactions(user_id)
+        LLM_FALLBACKS.inc()
+        return fallback_message(product)
+
+async def generate_llm_message_async(persona, product, reason, use_cache=True, timeout=None):
+    cache = get_message_cache() if use_cache else None
+    key   = make_key(LLM_MODEL, persona, product, reason)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    try:
+        message = await llm.acomplete(
+            [{"role": "user", "content": message_prompt(persona, product, reason)}],
+            model=LLM_MODEL,
+            timeout=timeout
+        )
+        if cache is not None:
+            cache.set(key, message)
+        return message
+    except Exception as e:
+        print(f"GROQ ERROR: {e!r}")
+        LLM_FALLBACKS.inc()
+        return fallback_message(product)
+
+# ── Function 9a: Instant Messages ────────────────────────
+# analyze_user answers with the message bank's template (or the LLM message
+# if one is already cached) and queues the LLM call in the background; the
+# personalised message then appears under message_key in the cache. Queued
+# keys are marked pending in the shared cache, so message_status answers
+# "pending" on every worker, not only the one running the call.
+def message_key(persona, product, reason):
+    return make_key(LLM_MODEL, persona, product, reason)
+
+def _enrich(persona, product, reason):
+    try:
+        generate_llm_message(persona, product, reason)
+    finally:
+        get_message_cache().clear_pending(message_key(persona, product, reason))
+
+enricher = MessageEnricher(_enrich)
+
+def instant_message(persona, product, reason, guardrail="passed"):
+    # -> (message_key, message, "llm" | "template")
+    key    = message_key(persona, product, reason)
+    cached = get_message_cache().get(key)
+    if cached is not None:
+        return key, cached, "llm"
+    if not enricher.is_pending(key):
+        get_message_cache().mark_pending(key)
+        if not enricher.submit(key, persona, product, reason):
+            get_message_cache().clear_pending(key)
+    return key, get_message_bank().get(persona, product, guardrail), "template"
+
+def message_status(key):
+    cached = get_message_cache().get(key)
+    if cached is not None:
+        return {"status": "ready", "message": cached}
+    if enricher.is_pending(key) or get_message_cache().is_pending(key):
+        return {"status": "pending", "message": None}
+    return {"status": "unavailable", "message": None}
+
+# ── Function 9b: Batched Personalised Messages ───────────
+# Many (persona, product, reason) items share one completion: distinct
+# uncached items are packed into a JSON prompt until LLM_BATCH_TOKENS
+# (rough estimate, ~4 characters per token, plus LLM_MESSAGE_TOKENS of
+# output per item) or LLM_BATCH_MAX_ITEMS is reached, and the model answers
+# with {"messages": [{"id", "message"}]}. Items missing from or malformed
+# in the answer, or in a batch whose call fails, get fallback_message.
+LLM_BATCH_TOKENS    = int(os.getenv("LLM_BATCH_TOKENS", "6000"))
+LLM_BATCH_MAX_ITEMS = int(os.getenv("LLM_BATCH_MAX_ITEMS", "40"))
+LLM_MESSAGE_TOKENS  = int(os.getenv("LLM_MESSAGE_TOKENS", "80"))
+# Deadline per packed call: LLM_TIMEOUT plus LLM_BATCH_ITEM_SECONDS per
+# item, since output (and so latency) grows with the batch. Batch calls go
+# through llm's batch_breaker and are never hedged.
+LLM_BATCH_ITEM_SECONDS = float(os.getenv("LLM_BATCH_ITEM_SECONDS", "0.5"))
+
+BATCH_INSTRUCTIONS = """
+        You are a warm friendly bank assistant.
+        For every customer in the JSON list below, write a short 2 line
+        personalised message recommending their product. Be friendly and
+        specific, not robotic.
+        Reply with a JSON object {"messages": [{"id": <id>, "message": "<text>"}]}
+        containing exactly one entry per customer id.
+        """
 
-    if not transactions:
-        return {"error": f"No data found for user {user_id}"}
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def pack_batches(items, token_budget=None, max_items=None):
+    # items: [(id, persona, product, reason)] -> lists that fit one prompt
+    token_budget = token_budget or LLM_BATCH_TOKENS
+    max_items    = max_items or LLM_BATCH_MAX_ITEMS
+    batches, batch, used = [], [], estimate_tokens(BATCH_INSTRUCTIONS)
+    for item in items:
+        cost = estimate_tokens(json.dumps(item)) + LLM_MESSAGE_TOKENS
+        if batch and (used + cost > token_budget or len(batch) >= max_items):
+            batches.append(batch)
+            batch, used = [], estimate_tokens(BATCH_INSTRUCTIONS)
+        batch.append(item)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+def batch_timeout(batch):
+    return llm.LLM_TIMEOUT + LLM_BATCH_ITEM_SECONDS * len(batch)
+
+def batch_prompt(batch):
+    customers = [{"id": i, "customer_type": p, "product": f, "why": r} for i, p, f, r in batch]
+    return [{"role": "user", "content": BATCH_INSTRUCTIONS + "\n" + json.dumps(customers)}]
+
+def parse_batch(content, batch):
+    # {id: message} for the well-formed entries of one batch answer
+    try:
+        entries = json.loads(content).get("messages", [])
+    except (ValueError, AttributeError):
+        return {}
+    wanted, parsed = {i for i, *_ in batch}, {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            i = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        message = entry.get("message")
+        if i in wanted and isinstance(message, str) and message.strip():
+            parsed[i] = message.strip()
+    return parsed
+
+# Both touch the SQLite cache tier (one lookup / one write transaction per
+# call); the async path runs them in the threadpool, off the event loop.
+def _plan_messages(items, cache):
+    # distinct cache misses as numbered batch items, plus the cached hits
+    keys    = [make_key(LLM_MODEL, persona, product, reason) for persona, product, reason in items]
+    found   = cache.get_many(keys) if cache is not None else {}
+    missing = {}
+    for key, (persona, product, reason) in zip(keys, items):
+        if key not in found and key not in missing:
+            missing[key] = (len(missing), persona, product, reason)
+    return keys, found, missing
+
+def _settle_batch(batch, content, missing_keys, found, cache):
+    parsed = parse_batch(content, batch) if content is not None else {}
+    failed = 0
+    fresh  = []
+    for i, persona, product, reason in batch:
+        message = parsed.get(i)
+        if message is None:
+            failed += 1
+            message = fallback_message(product)
+        else:
+            fresh.append((missing_keys[i], message))
+        found[missing_keys[i]] = message
+    if fresh and cache is not None:
+        cache.set_many(fresh)
+    if failed:
+        LLM_FALLBACKS.inc(amount=failed)
+
+def generate_llm_messages(items, use_cache=True, token_budget=None):
+    # items: [(persona, product, reason)] -> messages in the same order
+    cache = get_message_cache() if use_cache else None
+    keys, found, missing = _plan_messages(items, cache)
+    missing_keys = list(missing)
+    for batch in pack_batches(list(missing.values()), token_budget):
+        try:
+            content = llm.complete(batch_prompt(batch), model=LLM_MODEL, timeout=batch_timeout(batch),
+                                   batch=True, response_format={"type": "json_object"})
+        except Exception as e:
+            print(f"GROQ ERROR: {e}")
+            content = None
+        _settle_batch(batch, content, missing_keys, found, cache)
+    return [found[key] for key in keys]
+
+async def generate_llm_messages_async(items, use_cache=True, token_budget=None, timeout=None):
+    cache = await run_in_threadpool(get_message_cache) if use_cache else None
+    keys, found, missing = await run_in_threadpool(_plan_messages, items, cache)
+    missing_keys = list(missing)
+
+    async def run(batch):
+        try:
+            content = await llm.acomplete(batch_prompt(batch), model=LLM_MODEL,
+                                          timeout=timeout or batch_timeout(batch), batch=True,
+                                          response_format={"type": "json_object"})
+        except Exception as e:
+            print(f"GROQ ERROR: {e!r}")
+            content = None
+        await run_in_threadpool(_settle_batch, batch, content, missing_keys, found, cache)
+
+    await asyncio.gather(*[run(batch) for batch in pack_batches(list(missing.values()), token_budget)])
+    return [found[key] for key in keys]
 
-    behaviour  = detect_behaviour(transactions)
+# ── Function 10: Master analyze_user Function ─────────────
+def score_behaviour(user_id, behaviour):
     life_event = detect_life_event(behaviour)
     persona    = detect_persona(behaviour, life_event)
     product    = recommend_product(persona, life_event)
     confidence = calculate_confidence(behaviour, persona, life_event)
     guardrail  = guardrail_check(persona, behaviour, product)
     reason     = generate_reason(behaviour, persona, life_event)
-    message    = generate_llm_message(persona, guardrail["final_product"], reason)
 
     return {
         "user_id":        user_id,
@@ -241,9 +821,140 @@ def analyze_user(user_id: str):
         "reason":         reason,
         "guardrail":      guardrail["guardrail"],
         "guardrail_note": guardrail["guardrail_reason"],
-        "message":        message
     }
 
+def score_transactions(user_id, transactions):
+    return score_behaviour(user_id, detect_behaviour(transactions))
+
+# Reads aggregated totals (file + live events) rather than raw rows; with
+# window_days set, only that trailing window counts.
+# Stage timings land in the finpulse_stage_seconds histogram (metrics.py).
+def score_user(user_id, window_days=None, as_of=None, path=None):
+    with STAGE_SECONDS.time("load"):
+        totals = user_totals(user_id, window_days, as_of, path)
+    if totals is None:
+        return None
+    with STAGE_SECONDS.time("behaviour"):
+        behaviour = behaviour_from_totals(totals)
+    with STAGE_SECONDS.time("rules"):
+        return score_behaviour(user_id, behaviour)
+
+def _with_message(result):
+    key, message, source = instant_message(
+        result["persona"], result["product"], result["reason"], result["guardrail"]
+    )
+    result["message"]        = message
+    result["message_source"] = source
+    result["message_key"]    = key
+    return result
+
+# The message never waits on the LLM; see Function 9a.
+def analyze_user(user_id: str, window_days=None, as_of=None, path=None):
+    result = score_user(user_id, window_days, as_of, path)
+
+    if result is None:
+        return {"error": f"No data found for user {user_id}"}
+
+    return _with_message(result)
+
+# ── Batch Scoring ─────────────────────────────────────────
+# Column-wise versions of Functions 2-8. Every behaviour feature is computed
+# for all users in one grouped aggregation and the rule set is evaluated as
+# masks, so scoring the whole portfolio never loops over users in Python.
+# behaviour_frame mirrors detect_behaviour and must be kept in step with it.
+# Function 2 over per-user totals (columns BUCKET_COLUMNS plus salary_count)
+def behaviour_frame_from_totals(t):
+    b = pd.DataFrame(index=t.index)
+    for column in BEHAVIOUR_CATEGORIES:
+        b[column] = t[column].round().astype(int)
+    b["salary_detected"] = b.pop("salary_count") > 0
+    b["total_spent"]     = t["total_spent"].round(2)
+    b["total_income"]    = t["total_income"].round(2)
+    b["low_balance"]     = (t["total_income"] - t["total_spent"]) < 500
+    b["food_spending"]   = np.where(b["food_count"] > 5, "high", "low")
+    b["is_traveler"]     = b["travel_count"] > 3
+    return b[[
+        "food_count", "travel_count", "salary_detected", "education_count",
+        "rent_count", "shopping_count", "entertainment_count", "total_spent",
+        "total_income", "low_balance", "food_spending", "is_traveler",
+    ]]
+
+# Per-user BUCKET_COLUMNS totals of a normalized transaction frame
+def behaviour_totals(df):
+    users = pd.Index(np.asarray(df["user_id"].unique(), dtype=object), name="user_id")
+    df    = df.assign(amount=transaction_amounts(df))
+
+    counts = (
+        df[df["category"].isin(list(BEHAVIOUR_CATEGORIES.values()))]
+        .groupby(["user_id", "category"], observed=True).size()
+        .unstack(fill_value=0)
+        .reindex(index=users, columns=list(BEHAVIOUR_CATEGORIES.values()), fill_value=0)
+    )
+    sums = (
+        df[df["type"].isin(["credit", "debit"])]
+        .groupby(["user_id", "type"], observed=True)["amount"].sum()
+        .unstack(fill_value=0.0)
+        .reindex(index=users, columns=["credit", "debit"], fill_value=0.0)
+    )
+
+    totals = pd.DataFrame(index=users)
+    for column, category in BEHAVIOUR_CATEGORIES.items():
+        totals[column] = counts[category]
+    totals["total_income"] = sums["credit"]
+    totals["total_spent"]  = sums["debit"]
+    return totals.astype(float)
+
+# Function 2 over a normalized transaction frame, one row per user
+def behaviour_frame(df):
+    return behaviour_frame_from_totals(behaviour_totals(df))
+
+# Functions 3-8 over the output of behaviour_frame
+def score_behaviour_frame(b):
+    cols = {column: b[column].to_numpy() for column in b.columns}
+    out  = get_ruleset().evaluate_columns(cols, len(b))
+    return pd.DataFrame({"user_id": b.index.to_numpy(), **out})
+
+# Batch counterpart of analyze_user: one row per user that has transactions,
+# in the requested order (store order when user_ids is None), optionally
+# over a date window. The LLM message is only generated when asked for,
+# since it is one network call per row.
+def analyze_users(user_ids=None, path=None, with_message=False, window_days=None, as_of=None):
+    store  = get_transaction_store(path)
+    live   = get_live_aggregates()
+    wanted = None if user_ids is None else list(dict.fromkeys(user_ids))
+
+    with STAGE_SECONDS.time("load"):
+        # like user_totals, a missing file leaves just the live events
+        try:
+            if window_days is None:
+                totals = store.totals_frame() if wanted is None else store.totals_for(wanted)
+            else:
+                buckets    = store.buckets()
+                start, end = _window_bounds(window_days, as_of, buckets.latest, live.latest)
+                totals     = buckets.window_frame(window_days, end, wanted)
+        except FileNotFoundError:
+            print(f"Error: {path or TRANSACTIONS_PATH} not found.")
+            totals = pd.DataFrame(columns=BUCKET_COLUMNS, index=pd.Index([], name="user_id"), dtype=float)
+            if window_days is not None:
+                start, end = _window_bounds(window_days, as_of, live.latest)
+        streamed = live.frame() if window_days is None else live.frame(start, end)
+
+        if len(streamed):
+            totals = totals.add(streamed, fill_value=0.0)
+        if wanted is not None:
+            totals = totals.reindex([u for u in wanted if u in totals.index])
+
+    with STAGE_SECONDS.time("behaviour"):
+        behaviour = behaviour_frame_from_totals(totals)
+    with STAGE_SECONDS.time("rules"):
+        result = score_behaviour_frame(behaviour)
+
+    if with_message:
+        result["message"] = generate_llm_messages(
+            list(zip(result["persona"], result["product"], result["reason"]))
+        )
+    return result
+
 # ── Quick Test ────────────────────────────────────────────
 if __name__ == "__main__":
     for user in ["user_001", "user_002", "user_003"]:
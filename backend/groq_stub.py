@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# ── Local Groq Stand-in ───────────────────────────────────
+# A minimal OpenAI/Groq-compatible chat completions server for offline and
+# load testing. Latency and failure rates are configurable so the LLM
+# paths in engine.py and main.py can be exercised under realistic and
+# degraded conditions:
+#
+#   python groq_stub.py --port 8090 --latency-ms 400 --jitter-ms 200 --error-rate 0.02
+#   GROQ_BASE_URL=http://127.0.0.1:8090 GROQ_API_KEY=stub uvicorn main:app
+#
+# The Groq SDK reads GROQ_BASE_URL, so nothing else needs to change.
+# Each knob can also be set through the environment under the same name:
+# --latency-ms is STUB_LATENCY_MS, --rate-limit-rate is STUB_RATE_LIMIT_RATE,
+# and so on.
+# Requests asking for response_format json_object get an analysis JSON
+# shaped like the one /analyze-text expects; others get a short message.
+
+STUB_LATENCY_MS      = float(os.getenv("STUB_LATENCY_MS", "300"))
+STUB_JITTER_MS       = float(os.getenv("STUB_JITTER_MS", "100"))
+STUB_ERROR_RATE      = float(os.getenv("STUB_ERROR_RATE", "0"))
+STUB_RATE_LIMIT_RATE = float(os.getenv("STUB_RATE_LIMIT_RATE", "0"))
+STUB_TIMEOUT_RATE    = float(os.getenv("STUB_TIMEOUT_RATE", "0"))
+
+config = {
+    "latency_ms":      STUB_LATENCY_MS,
+    "jitter_ms":       STUB_JITTER_MS,
+    "error_rate":      STUB_ERROR_RATE,
+    "rate_limit_rate": STUB_RATE_LIMIT_RATE,
+    "timeout_rate":    STUB_TIMEOUT_RATE,
+}
+counters = {"requests": 0, "errors": 0, "rate_limited": 0, "timeouts": 0}
+
+app = FastAPI(title="Groq stub")
+
+KEYWORDS = [
+    ("tuition",  {"product": "education loan", "persona": "student", "life_event": "higher_education"}),
+    ("flight",   {"product": "travel card", "persona": "spender", "life_event": "frequent_traveler"}),
+    ("rent",     {"product": "basic savings account", "persona": "general", "life_event": "renter"}),
+    ("salary",   {"product": "SIP investment", "persona": "saver", "life_event": "employed"}),
+]
+
+
+def analysis_for(prompt: str) -> dict:
+    text = prompt.lower()
+    for keyword, result in KEYWORDS:
+        if keyword in text:
+            break
+    else:
+        result = {"product": "cashback card", "persona": "spender", "life_event": "unknown"}
+    return {
+        **result,
+        "confidence": 80,
+        "guardrail": "passed",
+        "reason": f"stub analysis of: {prompt[-80:]}",
+    }
+
+
+def batch_messages_for(prompt: str):
+    # engine.batch_prompt: instructions followed by a JSON list of customers
+    start = prompt.rfind("[{")
+    if '"messages"' not in prompt or start < 0:
+        return None
+    try:
+        customers = json.loads(prompt[start:])
+    except ValueError:
+        return None
+    return {"messages": [
+        {"id": c.get("id"), "message": f"Hi there! As a {c.get('customer_type')} customer, our "
+                                       f"{c.get('product')} is a great fit for you."}
+        for c in customers
+    ]}
+
+
+def completion(model: str, content: str) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def error(status: int, message: str, kind: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"error": {"message": message, "type": kind}})
+
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    counters["requests"] += 1
+
+    delay = max(0.0, random.gauss(config["latency_ms"], config["jitter_ms"])) / 1000
+    roll  = random.random()
+
+    if roll < config["timeout_rate"]:
+        counters["timeouts"] += 1
+        await asyncio.sleep(3600)
+    roll -= config["timeout_rate"]
+
+    await asyncio.sleep(delay)
+
+    if roll < config["rate_limit_rate"]:
+        counters["rate_limited"] += 1
+        return error(429, "Rate limit reached (stub)", "rate_limit_exceeded")
+    roll -= config["rate_limit_rate"]
+
+    if roll < config["error_rate"]:
+        counters["errors"] += 1
+        return error(500, "Internal server error (stub)", "internal_server_error")
+
+    prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+    model  = body.get("model", "stub")
+
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        content = json.dumps(batch_messages_for(prompt) or analysis_for(prompt))
+    else:
+        content = "Hi there! Based on your recent activity we think this product is a great fit for you."
+
+    return completion(model, content)
+
+
+@app.get("/stub/config")
+def get_config():
+    return {"config": config, "counters": counters}
+
+
+@app.post("/stub/config")
+def set_config(update: dict):
+    # adjust latency/error rates while a load test is running
+    for key, value in update.items():
+        if key in config:
+            config[key] = float(value)
+    return {"config": config}
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a local Groq-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=STUB_LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=STUB_JITTER_MS)
+    parser.add_argument("--error-rate", type=float, default=STUB_ERROR_RATE)
+    parser.add_argument("--rate-limit-rate", type=float, default=STUB_RATE_LIMIT_RATE)
+    parser.add_argument("--timeout-rate", type=float, default=STUB_TIMEOUT_RATE)
+    args = parser.parse_args(argv)
+
+    config.update({
+        "latency_ms":      args.latency_ms,
+        "jitter_ms":       args.jitter_ms,
+        "error_rate":      args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "timeout_rate":    args.timeout_rate,
+    })
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, delete
+from sqlalchemy.orm import Session
+from database import SessionLocal, LiveTotal
+
+# ── Shared Live Totals ────────────────────────────────────
+# Database-backed counterpart of engine.LiveAggregates. Ingested events are
+# folded into live_totals, one row per (user_id, day) whose counters are
+# incremented in place like audit_rollups, one transaction per ingest.
+# Reads are an indexed SUM over the user's rows, so every uvicorn worker
+# and serverless instance scores the same events and nothing has to be
+# replayed on start.
+
+
+def _day(value):
+    return None if value is None else np.datetime64(value, "D").item()
+
+
+class LiveTotals:
+
+    def __init__(self, columns, category_column, session_factory=SessionLocal):
+        # columns: engine.BUCKET_COLUMNS; category_column: {category: index}
+        self.columns         = list(columns)
+        self.category_column = category_column
+        self.session_factory = session_factory
+        self._income         = self.columns.index("total_income")
+        self._spent          = self.columns.index("total_spent")
+
+    def _increments(self, events):
+        rows = {}
+        for user_id, category, kind, amount, day in events:
+            key = (user_id, _day(day))
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = [0] * len(self.columns)
+            column = self.category_column.get(category)
+            if column is not None:
+                row[column] += 1
+            row[self._income if kind == "credit" else self._spent] += amount
+        return rows
+
+    def _upsert(self, db: Session, rows):
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            for (user_id, day), values in rows.items():
+                stmt = insert(LiveTotal).values(user_id=user_id, day=day, **dict(zip(self.columns, values)))
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=["user_id", "day"],
+                    set_={c: getattr(LiveTotal, c) + getattr(stmt.excluded, c) for c in self.columns}
+                ))
+            return
+
+        for (user_id, day), values in rows.items():
+            updated = db.query(LiveTotal).filter(
+                LiveTotal.user_id == user_id,
+                LiveTotal.day == day,
+            ).update({getattr(LiveTotal, c): getattr(LiveTotal, c) + v for c, v in zip(self.columns, values)},
+                     synchronize_session=False)
+            if not updated:
+                db.add(LiveTotal(user_id=user_id, day=day, **dict(zip(self.columns, values))))
+
+    def ingest(self, events):
+        db = self.session_factory()
+        try:
+            self._upsert(db, self._increments(events))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return len(events)
+
+    def _sums(self):
+        return [func.sum(getattr(LiveTotal, c)) for c in self.columns]
+
+    def _window(self, query, start, end):
+        if start is not None:
+            query = query.filter(LiveTotal.day > _day(start))
+        if end is not None:
+            query = query.filter(LiveTotal.day <= _day(end))
+        return query
+
+    @property
+    def latest(self):
+        db = self.session_factory()
+        try:
+            day = db.query(func.max(LiveTotal.day)).scalar()
+        finally:
+            db.close()
+        return None if day is None else np.datetime64(day, "D")
+
+    def totals(self, user_id, start=None, end=None):
+        # whole stream when start/end are None, else days in (start, end];
+        # None only when the user has no streamed events at all
+        db = self.session_factory()
+        try:
+            query = db.query(func.count(LiveTotal.id), *self._sums()).filter(LiveTotal.user_id == user_id)
+            count, *sums = self._window(query, start, end).one()
+            if count:
+                return [float(v) for v in sums]
+            if start is None and end is None:
+                return None
+            seen = db.query(LiveTotal.id).filter(LiveTotal.user_id == user_id).first()
+            return None if seen is None else [0.0] * len(self.columns)
+        finally:
+            db.close()
+
+    def frame(self, start=None, end=None):
+        # one row per user with streamed events, zeros outside the window
+        db = self.session_factory()
+        try:
+            users = [u for (u,) in db.query(LiveTotal.user_id).distinct()]
+            query = db.query(LiveTotal.user_id, *self._sums()).group_by(LiveTotal.user_id)
+            rows  = self._window(query, start, end).all()
+        finally:
+            db.close()
+        frame = pd.DataFrame([r[1:] for r in rows], index=pd.Index([r[0] for r in rows], name="user_id"),
+                             columns=self.columns, dtype=float)
+        return frame.reindex(pd.Index(users, name="user_id"), fill_value=0.0)
+
+    def reset(self):
+        db = self.session_factory()
+        try:
+            db.execute(delete(LiveTotal))
+            db.commit()
+        finally:
+            db.close()
@@ -0,0 +1,330 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from dotenv import load_dotenv
+from metrics import registry, STAGE_SECONDS, LLM_REQUESTS
+
+load_dotenv()
+
+# ── LLM Clients ───────────────────────────────────────────
+# One sync and one async Groq client shared by the engine and the API,
+# built (and the groq SDK imported) on first use rather than at import, so
+# cold starts that never call the LLM do not pay for it.
+# Async calls are bounded by a per-event-loop semaphore (LLM_CONCURRENCY).
+# Every call, sync or async, has a deadline (LLM_TIMEOUT seconds unless the
+# caller passes its own) that also covers waiting for a semaphore slot, so
+# neither a slow provider nor saturation can stretch p99 unbounded.
+
+GROQ_KEY        = os.getenv("GROQ_API_KEY")
+LLM_MODEL       = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+LLM_TIMEOUT     = float(os.getenv("LLM_TIMEOUT", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "256"))
+
+# Hedging: when a call is still pending after the LLM_HEDGE_PERCENTILE
+# latency of recent calls, a second identical call is raced against it
+# (0 disables). Circuit breaker: LLM_BREAKER_FAILURES consecutive failures
+# open it for LLM_BREAKER_COOLDOWN seconds, during which calls fail fast
+# with CircuitOpen and callers serve their template fallback; then a
+# single probe call decides whether it closes again.
+#
+# Packed batch calls (batch=True) are much larger than a single message, so
+# they are never hedged, stay out of the latency window and report to their
+# own batch_breaker; a few slow batches cannot open the breaker or move the
+# hedge delay for single-message callers.
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+LLM_HEDGE_MIN_DELAY  = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.05"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+_clients      = {}
+_clients_lock = threading.Lock()
+
+def _get(name):
+    found = _clients.get(name)
+    if found is None:
+        with _clients_lock:
+            found = _clients.get(name)
+            if found is None:
+                from groq import Groq, AsyncGroq
+                found = _clients[name] = (Groq if name == "client" else AsyncGroq)(
+                    api_key=GROQ_KEY, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES
+                )
+    return found
+
+def get_client():
+    return _get("client")
+
+def get_async_client():
+    return _get("async_client")
+
+def __getattr__(name):
+    # llm.client / llm.async_client keep working, created on first access
+    if name in ("client", "async_client"):
+        return _get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_semaphores = weakref.WeakKeyDictionary()
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    sem  = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(LLM_CONCURRENCY)
+    return sem
+
+# ── Circuit Breaker ───────────────────────────────────────
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN):
+        self.failures_allowed = failures
+        self.cooldown         = cooldown
+        self.state            = self.CLOSED
+        self.failures         = 0
+        self.opened_at        = None
+        self.times_opened     = 0
+        self.rejected         = 0
+        self._probing         = False
+        self._lock            = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED or self.failures_allowed <= 0:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state    = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state    = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing  = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failures_allowed:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state     = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        # a probe that was cancelled before it finished
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, round(self.cooldown - (time.monotonic() - self.opened_at), 3))
+            return {
+                "state":             self.state,
+                "failures":          self.failures,
+                "failure_threshold": self.failures_allowed,
+                "cooldown_seconds":  self.cooldown,
+                "retry_in_seconds":  retry_in,
+                "times_opened":      self.times_opened,
+                "rejected":          self.rejected,
+            }
+
+
+class LatencyWindow:
+
+    def __init__(self, size=256, min_samples=20):
+        self.min_samples = min_samples
+        self._samples    = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, p):
+        samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+breaker       = CircuitBreaker()
+batch_breaker = CircuitBreaker()
+latencies     = LatencyWindow()
+
+_hedges = registry.counter("finpulse_llm_hedges_total", "Hedged second LLM calls by winner", ("winner",))
+_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+registry.register_callback("finpulse_llm_breaker_state", "LLM circuit breaker (0 closed, 1 half-open, 2 open)",
+                           lambda: _STATES[breaker.state])
+
+def status():
+    return {
+        "breaker":         breaker.snapshot(),
+        "batch_breaker":   batch_breaker.snapshot(),
+        "timeout_seconds": LLM_TIMEOUT,
+        "hedge_after":     hedge_delay(),
+        "latency_p50":     latencies.percentile(50),
+        "latency_p95":     latencies.percentile(95),
+    }
+
+def hedge_delay():
+    if LLM_HEDGE_PERCENTILE <= 0:
+        return None
+    delay = latencies.percentile(LLM_HEDGE_PERCENTILE)
+    return None if delay is None else max(delay, LLM_HEDGE_MIN_DELAY)
+
+# ── Calls ─────────────────────────────────────────────────
+
+def _outcome(error):
+    if error is None:
+        return "ok"
+    if isinstance(error, CircuitOpen):
+        return "rejected"
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or "timeout" in type(error).__name__.lower():
+        return "timeout"
+    return "error"
+
+def _breaker(batch):
+    return batch_breaker if batch else breaker
+
+def _settle(error, batch=False):
+    LLM_REQUESTS.inc(_outcome(error))
+    if error is None:
+        _breaker(batch).record_success()
+        return
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None and 400 <= status_code < 500 and status_code != 429:
+        # our request was bad; the provider is fine
+        _breaker(batch).release()
+        return
+    _breaker(batch).record_failure()
+
+def complete(messages, model=None, timeout=None, batch=False, **kwargs) -> str:
+    if not _breaker(batch).allow():
+        LLM_REQUESTS.inc("rejected")
+        raise CircuitOpen("LLM circuit breaker is open")
+    error = None
+    try:
+        with STAGE_SECONDS.time("llm"):
+            started  = time.monotonic()
+            response = get_client().chat.completions.create(
+                model=model or LLM_MODEL,
+                messages=messages,
+                timeout=timeout or LLM_TIMEOUT,
+                **kwargs
+            )
+            if not batch:
+                latencies.add(time.monotonic() - started)
+        return response.choices[0].message.content
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _settle(error, batch)
+
+async def _acreate(messages, model, kwargs, batch=False):
+    started  = time.monotonic()
+    response = await get_async_client().chat.completions.create(
+        model=model or LLM_MODEL,
+        messages=messages,
+        **kwargs
+    )
+    if not batch:
+        latencies.add(time.monotonic() - started)
+    return response.choices[0].message.content
+
+async def _hedged(messages, model, kwargs, batch=False):
+    delay = None if batch else hedge_delay()
+    if delay is None:
+        return await _acreate(messages, model, kwargs, batch)
+
+    tasks = [asyncio.ensure_future(_acreate(messages, model, kwargs))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return tasks[0].result()
+
+        tasks.append(asyncio.ensure_future(_acreate(messages, model, kwargs)))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    _hedges.inc("hedge" if task is tasks[1] else "original")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def _bounded(messages, model, kwargs, admitted, batch):
+    # waits for an LLM_CONCURRENCY slot inside the caller's deadline
+    async with _semaphore():
+        admitted[0] = True
+        with STAGE_SECONDS.time("llm"):
+            return await _hedged(messages, model, kwargs, batch)
+
+async def acomplete(messages, model=None, timeout=None, batch=False, **kwargs) -> str:
+    if not _breaker(batch).allow():
+        LLM_REQUESTS.inc("rejected")
+        raise CircuitOpen("LLM circuit breaker is open")
+    error, cancelled, admitted = None, False, [False]
+    deadline = timeout or LLM_TIMEOUT
+    try:
+        # the SDK gets the same deadline, not the client's LLM_TIMEOUT default
+        return await asyncio.wait_for(
+            _bounded(messages, model, {**kwargs, "timeout": deadline}, admitted, batch),
+            timeout=deadline
+        )
+    except asyncio.CancelledError:
+        cancelled = True
+        _breaker(batch).release()
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if not cancelled and error is not None and not admitted[0]:
+            # timed out queued behind our own slots; the provider is fine
+            LLM_REQUESTS.inc("queue_timeout")
+            _breaker(batch).release()
+        elif not cancelled:
+            _settle(error, batch)
+
+# ── Single-flight ─────────────────────────────────────────
+# Concurrent callers asking for the same key share one in-flight call. The
+# shared task is shielded so a caller that disconnects does not cancel it
+# for the others; the entry is dropped as soon as the call settles.
+
+class SingleFlight:
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def __len__(self):
+        return len(self._inflight)
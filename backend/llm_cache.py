@@ -0,0 +1,273 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from metrics import registry
+
+# ── LLM Message Cache ─────────────────────────────────────
+# Two tiers: a small in-process LRU in front of an on-disk SQLite table, so
+# repeat (persona, product, reason) combinations skip the Groq round trip
+# both within a process and across restarts. Entries expire after a TTL and
+# the disk tier is capped, evicting the least recently used rows.
+#
+# The same file also holds pending markers: a worker that queues an LLM call
+# for a key marks it, so every worker sharing the cache can report the
+# message as on its way. Markers expire after LLM_PENDING_TTL seconds in case
+# the worker that set one dies before clearing it.
+
+LLM_CACHE_PATH           = os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite3")
+LLM_CACHE_TTL            = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES    = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "2048"))
+LLM_PENDING_TTL          = float(os.getenv("LLM_PENDING_TTL", "120"))
+
+# keys per IN (...) query, under SQLite's default bound-parameter limit
+SQLITE_IN_CHUNK = 500
+
+
+def normalize(value) -> str:
+    return " ".join(str(value).split()).lower()
+
+
+def make_key(*parts) -> str:
+    raw = "\x1f".join(normalize(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MessageCache:
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL,
+                 max_entries=LLM_CACHE_MAX_ENTRIES, memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+                 pending_ttl=LLM_PENDING_TTL):
+        self.ttl            = ttl
+        self.pending_ttl    = pending_ttl
+        self.max_entries    = max_entries
+        self.memory_entries = memory_entries
+        self._memory        = OrderedDict()
+        self._pending       = {}
+        self._lock          = threading.Lock()
+        self._conn          = None
+        self._disk_count    = 0
+        self.hits_memory    = 0
+        self.hits_disk      = 0
+        self.misses         = 0
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_messages ("
+                " key TEXT PRIMARY KEY,"
+                " message TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_messages_accessed ON llm_messages (accessed_at)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_pending ("
+                " key TEXT PRIMARY KEY,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM llm_messages WHERE expires_at <= ?", (time.time(),))
+            self._conn.execute("DELETE FROM llm_pending WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+            self._disk_count = self._conn.execute("SELECT COUNT(*) FROM llm_messages").fetchone()[0]
+
+    def _remember(self, key, message, expires_at):
+        self._memory[key] = (message, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.hits_memory += 1
+                    return entry[0]
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT message, expires_at FROM llm_messages WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._conn.execute(
+                        "UPDATE llm_messages SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+                    self._conn.commit()
+                    self._remember(key, row[0], row[1])
+                    self.hits_disk += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def get_many(self, keys):
+        # {key: message} for the keys that hit; disk hits are read with IN
+        # queries and their accessed_at updated in one transaction
+        now, found, pending = time.time(), {}, []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._memory.get(key)
+                if entry is not None and entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.hits_memory += 1
+                    found[key] = entry[0]
+                    continue
+                if entry is not None:
+                    del self._memory[key]
+                pending.append(key)
+
+            touched = []
+            if pending and self._conn is not None:
+                for i in range(0, len(pending), SQLITE_IN_CHUNK):
+                    chunk = pending[i:i + SQLITE_IN_CHUNK]
+                    rows  = self._conn.execute(
+                        "SELECT key, message, expires_at FROM llm_messages"
+                        f" WHERE key IN ({', '.join('?' * len(chunk))}) AND expires_at > ?",
+                        (*chunk, now)
+                    ).fetchall()
+                    for key, message, expires_at in rows:
+                        self._remember(key, message, expires_at)
+                        found[key] = message
+                        touched.append((now, key))
+                if touched:
+                    self._conn.executemany("UPDATE llm_messages SET accessed_at = ? WHERE key = ?", touched)
+                    self._conn.commit()
+
+            self.hits_disk += len(touched)
+            self.misses    += len(pending) - len(touched)
+            return found
+
+    def set(self, key, message):
+        self.set_many([(key, message)])
+
+    def set_many(self, items):
+        # items: (key, message) pairs, written in one transaction
+        now        = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            for key, message in items:
+                self._remember(key, message, expires_at)
+                if self._conn is None:
+                    continue
+                existed = self._conn.execute(
+                    "SELECT 1 FROM llm_messages WHERE key = ?", (key,)
+                ).fetchone() is not None
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_messages (key, message, expires_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, message, expires_at, now)
+                )
+                if not existed:
+                    self._disk_count += 1
+            if self._conn is None:
+                return
+            if self._disk_count > self.max_entries:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        # Drop expired rows first, then the least recently used ones, down to
+        # 90% of the cap so eviction does not run on every insert.
+        self._conn.execute("DELETE FROM llm_messages WHERE expires_at <= ?", (now,))
+        target = int(self.max_entries * 0.9)
+        count  = self._conn.execute("SELECT COUNT(*) FROM llm_messages").fetchone()[0]
+        if count > target:
+            self._conn.execute(
+                "DELETE FROM llm_messages WHERE key IN ("
+                " SELECT key FROM llm_messages ORDER BY accessed_at LIMIT ?)",
+                (count - target,)
+            )
+            count = target
+        self._disk_count = count
+
+    def mark_pending(self, key):
+        expires_at = time.time() + self.pending_ttl
+        with self._lock:
+            if self._conn is None:
+                self._pending[key] = expires_at
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_pending (key, expires_at) VALUES (?, ?)", (key, expires_at)
+            )
+            self._conn.commit()
+
+    def clear_pending(self, key):
+        with self._lock:
+            if self._conn is None:
+                self._pending.pop(key, None)
+                return
+            self._conn.execute("DELETE FROM llm_pending WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def is_pending(self, key):
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                expires_at = self._pending.get(key)
+            else:
+                row = self._conn.execute(
+                    "SELECT expires_at FROM llm_pending WHERE key = ?", (key,)
+                ).fetchone()
+                expires_at = row and row[0]
+            return bool(expires_at) and expires_at > now
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._pending.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_messages")
+                self._conn.execute("DELETE FROM llm_pending")
+                self._conn.commit()
+            self._disk_count = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "hits_memory":    self.hits_memory,
+                "hits_disk":      self.hits_disk,
+                "misses":         self.misses,
+                "hit_rate":       round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries":   self._disk_count,
+            }
+
+
+_cache      = None
+_cache_lock = threading.Lock()
+
+def get_message_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = MessageCache()
+    return _cache
+
+def _lookup_counts():
+    if _cache is None:
+        return {}
+    stats = _cache.stats()
+    return {"hit_memory": stats["hits_memory"], "hit_disk": stats["hits_disk"], "miss": stats["misses"]}
+
+def _hit_ratio():
+    return 0.0 if _cache is None else _cache.stats()["hit_rate"]
+
+registry.register_callback("finpulse_llm_cache_lookups_total", "LLM message cache lookups by result",
+                           _lookup_counts, kind="counter", labels=("result",))
+registry.register_callback("finpulse_llm_cache_hit_ratio", "LLM message cache hit ratio since start",
+                           _hit_ratio)
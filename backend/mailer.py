@@ -0,0 +1,461 @@
+import asyncio
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from dotenv import load_dotenv
+from database import SessionLocal, EmailJobRecord
+from metrics import registry
+
+load_dotenv()
+
+# ── Email Delivery ────────────────────────────────────────
+# Outgoing offer emails go through a background queue drained by
+# SMTP_POOL_SIZE sender threads. Each thread reuses a persistent SMTP
+# connection from a shared pool (one TLS handshake and login per
+# connection, not per email), sends are paced by a token bucket
+# (SMTP_RATE_LIMIT emails/sec across all threads), and transient failures
+# are retried with exponential backoff up to SMTP_MAX_RETRIES times.
+#
+# Every submission belongs to an EmailJob whose progress can be polled;
+# /dispatch-email is a one-recipient job it waits on, campaigns are large
+# jobs returned immediately. Job counters are kept in email_jobs, so any
+# worker can report progress; the emails themselves are queued in, and
+# sent by, the worker that accepted the job (stop() drains the queue).
+#
+# Without SMTP_EMAIL and SMTP_PASSWORD the mailer runs in simulation mode
+# and only logs. For local testing point it at smtp_sink.py, which accepts
+# any login:
+#
+#   python smtp_sink.py --port 1025
+#   SMTP_EMAIL=advisor@finpulse.test SMTP_PASSWORD=x SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_SECURITY=none
+
+SMTP_EMAIL         = os.getenv("SMTP_EMAIL")
+SMTP_PASSWORD      = os.getenv("SMTP_PASSWORD")
+SMTP_HOST          = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT          = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SECURITY      = os.getenv("SMTP_SECURITY", "ssl")   # ssl | starttls | none
+SMTP_TIMEOUT       = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_POOL_SIZE     = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_IDLE_TIMEOUT  = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+SMTP_RATE_LIMIT    = float(os.getenv("SMTP_RATE_LIMIT", "10"))
+SMTP_MAX_RETRIES   = int(os.getenv("SMTP_MAX_RETRIES", "3"))
+SMTP_RETRY_BACKOFF = float(os.getenv("SMTP_RETRY_BACKOFF", "1"))
+EMAIL_QUEUE_SIZE   = int(os.getenv("EMAIL_QUEUE_SIZE", "100000"))
+# email_jobs counters are written every EMAIL_PROGRESS_EVERY sends or
+# EMAIL_PROGRESS_INTERVAL seconds, and when a job finishes
+EMAIL_PROGRESS_EVERY    = int(os.getenv("EMAIL_PROGRESS_EVERY", "100"))
+EMAIL_PROGRESS_INTERVAL = float(os.getenv("EMAIL_PROGRESS_INTERVAL", "1"))
+
+_STOP = object()
+
+_sent = registry.counter("finpulse_emails_total", "Emails handled by the mailer by result", ("result",))
+
+
+def render_offer(sender, customer_email, customer_name, offer_message, product_name):
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = "A Personalized Offer from FinPulse Bank"
+    msg["From"] = f"FinPulse Advisor <{sender}>"
+    msg["To"] = customer_email
+
+    html = f"""
+        <html>
+          <body style="font-family: Arial, sans-serif; background-color: #f4f7f6; padding: 20px;">
+            <div style="max-w-md mx-auto bg-white p-6 rounded-lg shadow-md border-t-4 border-blue-600">
+                <h2 style="color: #1e3a8a;">Hello {customer_name},</h2>
+                <p style="color: #475569; line-height: 1.6;">
+                    {offer_message}
+                </p>
+                <div style="margin-top: 30px; text-align: left;">
+                    <a href="https://finpulse-ai-iota.vercel.app/" style="background-color: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; font-weight: bold; display: inline-block;">
+                        Explore {product_name}
+                    </a>
+                </div>
+                <hr style="margin-top: 40px; border: none; border-top: 1px solid #e2e8f0;" />
+                <p style="color: #94a3b8; font-size: 12px; margin-top: 20px;">
+                    This is an AI-generated personalized offer sent by your FinPulse Advisor.
+                </p>
+            </div>
+          </body>
+        </html>
+        """
+
+    msg.attach(MIMEText(html, "html"))
+    return msg
+
+
+def _permanent(error):
+    # 5xx replies and refused recipients will not succeed on a retry
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    code = getattr(error, "smtp_code", None)
+    return isinstance(code, int) and 500 <= code < 600
+
+
+def _broken(error):
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if not isinstance(error, smtplib.SMTPException):
+        return True
+    return getattr(error, "smtp_code", None) == 421
+
+
+class RateLimiter:
+
+    # token bucket shared by all sender threads; rate <= 0 disables it
+
+    def __init__(self, rate, burst=None):
+        self.rate   = rate
+        self.burst  = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.stamp  = time.monotonic()
+        self._lock  = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp  = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SMTPPool:
+
+    # Up to `size` logged-in connections, handed out one per sender thread
+    # and returned after each email. Connections idle for longer than
+    # idle_timeout are probed with NOOP before reuse.
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, security=SMTP_SECURITY, user=SMTP_EMAIL,
+                 password=SMTP_PASSWORD, size=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT,
+                 timeout=SMTP_TIMEOUT):
+        self.host         = host
+        self.port         = port
+        self.security     = security
+        self.user         = user
+        self.password     = password
+        self.idle_timeout = idle_timeout
+        self.timeout      = timeout
+        self.opened       = 0
+        self._idle        = deque()
+        self._slots       = threading.BoundedSemaphore(size)
+        self._lock        = threading.Lock()
+
+    def _connect(self):
+        if self.security == "ssl":
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                conn.starttls()
+        conn.login(self.user, self.password)
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    return self._connect()
+                conn, since = entry
+                if time.monotonic() - since < self.idle_timeout:
+                    return conn
+                try:
+                    if conn.noop()[0] == 250:
+                        return conn
+                except smtplib.SMTPException:
+                    pass
+                except OSError:
+                    pass
+                self._close(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        if broken:
+            self._close(conn)
+        else:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        self._slots.release()
+
+    def _close(self, conn):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._close(conn)
+
+
+class EmailJob:
+
+    # in-process handle for the worker sending the job; progress is read
+    # from email_jobs via Mailer.progress
+
+    def __init__(self, total, kind="campaign"):
+        self.id         = uuid.uuid4().hex
+        self.kind       = kind
+        self.total      = total
+        self.sent       = 0
+        self.failed     = 0
+        self.errors     = deque(maxlen=20)
+        self._done      = threading.Event()
+        self._lock      = threading.Lock()
+        self._callbacks = []
+
+    def record(self, recipient, error=None):
+        # True for the call that completes the job
+        with self._lock:
+            if error is None:
+                self.sent += 1
+            else:
+                self.failed += 1
+                self.errors.append({"recipient": recipient, "error": str(error)})
+            if self.sent + self.failed < self.total:
+                return False
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+        return True
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    async def wait_async(self, timeout):
+        # like wait(), without holding a thread while the email is sent
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(wake)
+                finished = False
+            else:
+                finished = True
+        if finished:
+            return True
+        try:
+            await asyncio.wait_for(done, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def job_status(sent, failed, total, finished):
+    if finished is not None and sent + failed >= total:
+        return "completed" if not failed else ("failed" if not sent else "completed_with_errors")
+    return "running" if sent or failed else "queued"
+
+
+class Mailer:
+
+    def __init__(self, sender=SMTP_EMAIL, pool=None, workers=SMTP_POOL_SIZE, rate=SMTP_RATE_LIMIT,
+                 max_retries=SMTP_MAX_RETRIES, backoff=SMTP_RETRY_BACKOFF, max_queue=EMAIL_QUEUE_SIZE,
+                 session_factory=SessionLocal):
+        self.sender          = sender
+        self.pool            = pool or SMTPPool(size=workers)
+        self.workers         = workers
+        self.limiter         = RateLimiter(rate)
+        self.max_retries     = max_retries
+        self.backoff         = backoff
+        self.session_factory = session_factory
+        self._queue          = queue.Queue(maxsize=max_queue)
+        self._threads        = []
+        self._lock           = threading.Lock()
+        self._submit_lock    = threading.Lock()
+        self._progress       = {}
+        self._progress_lock  = threading.Lock()
+        self._progress_sends = 0
+        self._progress_at    = time.monotonic()
+
+    @property
+    def simulated(self):
+        return not (self.sender and self.pool.password)
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"mailer-{i}", daemon=True)
+                for i in range(max(1, self.workers))
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=30):
+        # sends what is already queued, then closes pooled connections
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+        self._flush_progress()
+        self.pool.close()
+
+    def submit(self, recipients, kind="campaign"):
+        # recipients: dicts with customer_email, customer_name, offer_message,
+        # product_name. Raises queue.Full when the queue cannot take them all;
+        # never blocks, since the check and the enqueue happen under one lock.
+        with self._submit_lock:
+            if self._queue.qsize() + len(recipients) > self._queue.maxsize:
+                raise queue.Full
+            self.start()
+            job = EmailJob(len(recipients), kind)
+            self._save_job(job)
+            for recipient in recipients:
+                self._queue.put_nowait((job, recipient))
+        return job
+
+    def _save_job(self, job):
+        db = self.session_factory()
+        try:
+            db.add(EmailJobRecord(id=job.id, kind=job.kind, total=job.total))
+            db.commit()
+        finally:
+            db.close()
+
+    def _count(self, job, recipient, error, finished):
+        # folds one send into the pending email_jobs deltas, written in one
+        # transaction when enough have built up or the job is done
+        with self._progress_lock:
+            delta = self._progress.setdefault(job.id, [0, 0, None, None])
+            if error is None:
+                delta[0] += 1
+            else:
+                delta[1] += 1
+                delta[2] = f"{recipient}: {error}"[:500]
+            if finished:
+                delta[3] = datetime.utcnow()
+            self._progress_sends += 1
+            due = (finished or self._progress_sends >= EMAIL_PROGRESS_EVERY
+                   or time.monotonic() - self._progress_at >= EMAIL_PROGRESS_INTERVAL)
+        if due:
+            self._flush_progress()
+
+    def _flush_progress(self):
+        with self._progress_lock:
+            deltas, self._progress = self._progress, {}
+            self._progress_sends   = 0
+            self._progress_at      = time.monotonic()
+        if not deltas:
+            return
+        db = self.session_factory()
+        try:
+            for job_id, (sent, failed, last_error, finished) in deltas.items():
+                values = {EmailJobRecord.sent:   EmailJobRecord.sent + sent,
+                          EmailJobRecord.failed: EmailJobRecord.failed + failed}
+                if last_error is not None:
+                    values[EmailJobRecord.last_error] = last_error
+                if finished is not None:
+                    values[EmailJobRecord.finished] = finished
+                db.query(EmailJobRecord).filter(EmailJobRecord.id == job_id).update(values, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            # delivery already happened; only the progress counters are behind
+            db.rollback()
+            print(f"⚠️ Email job progress not saved: {e}")
+        finally:
+            db.close()
+
+    def progress(self, job_id):
+        db = self.session_factory()
+        try:
+            row = db.get(EmailJobRecord, job_id)
+        finally:
+            db.close()
+        if row is None:
+            return None
+        return {
+            "job_id":     row.id,
+            "kind":       row.kind,
+            "status":     job_status(row.sent, row.failed, row.total, row.finished),
+            "total":      row.total,
+            "sent":       row.sent,
+            "failed":     row.failed,
+            "pending":    row.total - row.sent - row.failed,
+            "last_error": row.last_error,
+            "created":    row.created.isoformat() if row.created else None,
+            "finished":   row.finished.isoformat() if row.finished else None,
+        }
+
+    def _send(self, recipient):
+        if self.simulated:
+            print(f"⚠️ Simulation Mode: Would have sent email to {recipient['customer_email']}")
+            print(f"Offer: {recipient['offer_message']}")
+            return
+
+        message = render_offer(self.sender, **recipient).as_string()
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            conn = None
+            try:
+                conn = self.pool.acquire()
+                conn.sendmail(self.sender, recipient["customer_email"], message)
+            except OSError as e:
+                # smtplib resets the session after a refused message; socket
+                # errors and 421 leave it half-dead, so it is not reused
+                if conn is not None:
+                    self.pool.release(conn, broken=_broken(e))
+                if _permanent(e) or attempt == self.max_retries:
+                    raise
+                _sent.inc("retried")
+                time.sleep(self.backoff * 2 ** attempt)
+            else:
+                self.pool.release(conn)
+                return
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            job, recipient = item
+            address, error = recipient.get("customer_email"), None
+            try:
+                self._send(recipient)
+            except Exception as e:
+                print(f"❌ Email Dispatch Failed: {e}")
+                error = e
+            _sent.inc("sent" if error is None else "failed")
+            self._count(job, address, error, job.record(address, error))
+
+
+mailer = Mailer()
+
+registry.register_callback("finpulse_email_queue_depth", "Emails waiting to be sent",
+                           lambda: mailer._queue.qsize())
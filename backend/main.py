@@ -1,21 +1,34 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, PlainTextResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from database import get_db, create_tables, User, AuditLog
-from auth import hash_password, verify_password, create_token, get_current_user
-
-from collections import Counter
-from datetime import datetime, timedelta
+from database import get_db, missing_tables, User
+from auth import create_token, get_current_user, invalidate_user, profile_claims
+from auth import require_admin, token_is_admin
+from employee_ids import employee_ids
+from passwords import hash_password_async, verify_password_async, hash_pool, PoolBusy
+from audit_writer import audit_writer, AUDIT_SYNC_WRITES
+from audit_stats import rollup_stats, ROLLUP_DIMENSIONS, FALLBACK_GUARDRAIL
+from migrate import migrate
+from audit_query import query_audit_logs, distinct_customers, MAX_PAGE_SIZE
+from metrics import registry, MetricsMiddleware, CONTENT_TYPE, LLM_FALLBACKS
+from profiling import ProfilingMiddleware, list_profiles, read_profile
+from mailer import mailer
+
+from datetime import datetime, timedelta, date
+from typing import Optional, List, Union
 from dotenv import load_dotenv
-from groq import Groq
+from starlette.concurrency import run_in_threadpool
+import llm
+from llm import acomplete, SingleFlight
+from llm_cache import normalize
 
 import jwt
 import os
+import sys
 import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import queue
 
 # ========================
 # LOAD ENV
@@ -27,8 +40,6 @@ SECRET_KEY = os.getenv("SECRET_KEY", "finpulse-secret")
 ACCESS_EXPIRE_MINUTES = 60
 REFRESH_EXPIRE_DAYS = 7
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
 app = FastAPI(title="FinPulse AI Backend")
 
 # ========================
@@ -51,47 +62,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ========================
-# AUTO EMPLOYEE ID GENERATOR
-# ========================
-
-def generate_employee_id(db: Session):
-
-    last = db.query(User).order_by(User.id.desc()).first()
-
-    if not last:
-        return "EMP001"
-
-    try:
-        num = int(last.employee_id.replace("EMP", ""))
-        return f"EMP{num+1:03d}"
-    except:
-        return "EMP001"
+# per-route latency histograms, exposed on GET /metrics
+app.add_middleware(MetricsMiddleware)
 
+# admin-only "X-Profile: 1" / "?profile=1" request profiling, see profiling.py
+app.add_middleware(ProfilingMiddleware, is_admin=token_is_admin)
 
 # ========================
-# DEFAULT ADMIN CREATION
+# AUTO EMPLOYEE ID GENERATOR
 # ========================
 
-def create_default_admin(db: Session):
-
-    admin = db.query(User).filter(User.role == "admin").first()
-
-    if admin:
-        return
-
-    admin_user = User(
-        employee_id="EMP000",
-        name="System Admin",
-        email="admin@finpulse.ai",
-        password_hash=hash_password("admin123"),
-        role="admin"
-    )
-
-    db.add(admin_user)
-    db.commit()
+def generate_employee_id(db: Session):
 
-    print("✅ Default admin created")
+    # allocated from a sequence / reserved block, see employee_ids.py
+    return employee_ids.next_id()
 
 
 # ========================
@@ -113,18 +97,47 @@ def create_refresh_token(employee_id: str):
 # STARTUP EVENT
 # ========================
 
+# Schema creation and admin seeding belong to `python migrate.py`, run once
+# per deploy. MIGRATE_ON_STARTUP=auto (the default) checks the table list
+# on start and runs the same idempotent migration only when a table is
+# missing, e.g. on a deploy that skipped the command after an upgrade;
+# true always migrates, false never does.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "auto").lower()
+# How long /dispatch-email awaits its queued email before answering
+# "queued" with the job id; no thread is held while it waits.
+EMAIL_DISPATCH_WAIT = float(os.getenv("EMAIL_DISPATCH_WAIT", "2"))
+
+
 @app.on_event("startup")
 def startup():
 
-    create_tables()
+    # in-memory live aggregates would differ from worker to worker
+    if os.getenv("LIVE_AGGREGATES") == "memory" and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        raise RuntimeError("LIVE_AGGREGATES=memory needs a single worker; use the database backend")
 
-    db = next(get_db())
+    if MIGRATE_ON_STARTUP == "true" or (MIGRATE_ON_STARTUP == "auto" and missing_tables()):
+        migrate()
 
-    create_default_admin(db)
+    audit_writer.start()
 
     print("🚀 FinPulse AI Backend Running")
 
 
+@app.on_event("shutdown")
+def shutdown():
+
+    # let queued message enrichments finish, if this worker ever scored
+    engine = sys.modules.get("engine")
+    if engine is not None:
+        engine.enricher.shutdown()
+
+    audit_writer.stop()
+
+    mailer.stop()
+
+    hash_pool.shutdown()
+
+
 # ========================
 # REQUEST MODELS
 # ========================
@@ -149,6 +162,29 @@ class TextAnalysisRequest(BaseModel):
     customer_name: str = "Anonymous Customer"
 
 
+class TransactionEvent(BaseModel):
+
+    user_id: Optional[str] = None
+    account_name: Optional[str] = None
+    amount: float
+    type: str
+    category: Optional[str] = None
+    date: Optional[str] = None
+    description: Optional[str] = None
+
+
+class MessageItem(BaseModel):
+
+    persona: str
+    product: str
+    reason: str
+
+
+class MessageBatchRequest(BaseModel):
+
+    items: List[MessageItem]
+
+
 class EmailDispatchRequest(BaseModel):
     
     customer_email: str
@@ -157,31 +193,58 @@ class EmailDispatchRequest(BaseModel):
     product_name: str
 
 
+class EmailCampaignRequest(BaseModel):
+
+    recipients: List[EmailDispatchRequest]
+
+
 # ========================
 # AUTH ROUTES
 # ========================
 
-@app.post("/auth/signup")
-def signup(req: SignupRequest, db: Session = Depends(get_db)):
+# bcrypt runs on the passwords.hash_pool process pool and the database work
+# on the threadpool, so a login burst never blocks the event loop.
 
-    employee_id = generate_employee_id(db)
+def find_user(db: Session, **filters):
 
-    existing = db.query(User).filter(User.email == req.email).first()
+    return db.query(User).filter_by(**filters).first()
 
-    if existing:
-        raise HTTPException(400, "Email already registered")
+
+def insert_user(db: Session, req: SignupRequest, password_hash: str):
+
+    employee_id = generate_employee_id(db)
 
     user = User(
         employee_id=employee_id,
         name=req.name,
         email=req.email,
-        password_hash=hash_password(req.password),
+        password_hash=password_hash,
         role=req.role
     )
 
     db.add(user)
     db.commit()
 
+    return employee_id
+
+
+@app.post("/auth/signup")
+async def signup(req: SignupRequest, db: Session = Depends(get_db)):
+
+    existing = await run_in_threadpool(find_user, db, email=req.email)
+
+    if existing:
+        raise HTTPException(400, "Email already registered")
+
+    try:
+        password_hash = await hash_password_async(req.password)
+    except PoolBusy:
+        raise HTTPException(503, "Too many authentication requests, retry shortly", headers={"Retry-After": "1"})
+
+    employee_id = await run_in_threadpool(insert_user, db, req, password_hash)
+
+    invalidate_user(employee_id)
+
     return {
         "status": "success",
         "employee_id": employee_id,
@@ -190,17 +253,21 @@ def signup(req: SignupRequest, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/login")
-def login(req: LoginRequest, db: Session = Depends(get_db)):
+async def login(req: LoginRequest, db: Session = Depends(get_db)):
+
+    user = await run_in_threadpool(find_user, db, employee_id=req.employee_id)
 
-    user = db.query(User).filter(User.employee_id == req.employee_id).first()
+    try:
+        valid = user is not None and await verify_password_async(req.password, user.password_hash)
+    except PoolBusy:
+        raise HTTPException(503, "Too many authentication requests, retry shortly", headers={"Retry-After": "1"})
 
-    if not user or not verify_password(req.password, user.password_hash):
+    if not valid:
         raise HTTPException(401, "Invalid credentials")
 
-    access_token = create_token({
-        "sub": user.employee_id,
-        "role": user.role
-    })
+    invalidate_user(user.employee_id)
+
+    access_token = create_token(profile_claims(user))
 
     refresh_token = create_refresh_token(user.employee_id)
 
@@ -265,25 +332,51 @@ def logout(current_user: User = Depends(get_current_user)):
 # ANALYSIS ROUTES
 # ========================
 
+# Identical descriptions (after whitespace/case normalization) that arrive
+# while a call is in flight share that call; each request still parses its
+# own copy of the response and writes its own audit row.
+analysis_flights = SingleFlight()
+
+# Served when the LLM times out, errors, returns unparseable output or its
+# circuit breaker is open, so a degraded provider never turns into a 500.
+def analysis_fallback():
+    return {
+        "persona": "general",
+        "life_event": "unknown",
+        "product": "basic savings account",
+        "confidence": 0,
+        "reason": "Automated analysis is temporarily unavailable; a default recommendation was used.",
+        "guardrail": "review",
+        "fallback": True
+    }
+
+
 @app.post("/analyze-text")
-def analyze_text(
+async def analyze_text(
     req: TextAnalysisRequest,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
 
-    try:
-        prompt = f"Analyze banking transaction: {req.description}"
+    prompt = f"Analyze banking transaction: {req.description}"
 
-        chat = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.3-70b-versatile",
-            response_format={"type": "json_object"}
+    try:
+        content = await analysis_flights.do(
+            normalize(req.description),
+            lambda: acomplete(
+                [{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"}
+            )
         )
+        res = json.loads(content)
+        if not isinstance(res, dict):
+            raise ValueError("LLM returned a non-object analysis")
+    except Exception as e:
+        print(f"Analysis error: {e!r}")
+        LLM_FALLBACKS.inc()
+        res = analysis_fallback()
 
-        res = json.loads(chat.choices[0].message.content)
-
-        log = AuditLog(
+    try:
+        log = dict(
             employee_id=current_user.employee_id,
             customer_id=req.customer_name,
             product_recommended=res.get("product", ""),
@@ -291,11 +384,15 @@ def analyze_text(
             persona=res.get("persona", ""),
             confidence=res.get("confidence", 80),
             reason=res.get("reason", ""),
-            guardrail=res.get("guardrail", "passed")
+            # fallbacks are kept for the audit trail but out of product stats
+            guardrail=FALLBACK_GUARDRAIL if res.get("fallback") else res.get("guardrail", "passed"),
+            timestamp=datetime.utcnow()
         )
 
-        db.add(log)
-        db.commit()
+        # queued for the background writer unless AUDIT_SYNC_WRITES is set;
+        # the direct-insert fallback (writer down, queue full) runs off the loop
+        if AUDIT_SYNC_WRITES or not audit_writer.enqueue(log):
+            await run_in_threadpool(audit_writer.write, log, AUDIT_SYNC_WRITES)
 
         return res
     except Exception as e:
@@ -303,16 +400,99 @@ def analyze_text(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/transactions")
+def ingest_transactions(
+    events: Union[List[TransactionEvent], TransactionEvent],
+    score: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+
+    # imported here so pandas is only loaded by workers that score
+    import engine
+
+    if not isinstance(events, list):
+        events = [events]
+
+    try:
+        users = engine.ingest_transactions([e.model_dump() for e in events])
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    response = {
+        "status": "success",
+        "ingested": len(events),
+        "users": users
+    }
+
+    # refreshed rule scores (no LLM message) straight from the aggregates
+    if score:
+        response["scores"] = [engine.score_user(u) for u in users]
+
+    return response
+
+
+@app.get("/analyze-user/{user_id}")
+def analyze_user(
+    user_id: str,
+    window_days: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+
+    import engine
+
+    # message comes from the template bank; poll /messages/{message_key}
+    # for the personalised LLM version
+    result = engine.analyze_user(user_id, window_days)
+
+    if "error" in result:
+        raise HTTPException(404, result["error"])
+
+    return result
+
+
+@app.get("/messages/{message_key}")
+def message_status(
+    message_key: str,
+    current_user: User = Depends(get_current_user)
+):
+
+    import engine
+
+    return engine.message_status(message_key)
+
+
+MAX_MESSAGE_BATCH = 10000
+
+
+@app.post("/messages/batch")
+async def batch_messages(
+    req: MessageBatchRequest,
+    current_user: User = Depends(get_current_user)
+):
+
+    import engine
+
+    if len(req.items) > MAX_MESSAGE_BATCH:
+        raise HTTPException(400, f"At most {MAX_MESSAGE_BATCH} items per request")
+
+    # packed many-per-prompt, cached per item, template fallback per item
+    messages = await engine.generate_llm_messages_async(
+        [(item.persona, item.product, item.reason) for item in req.items]
+    )
+
+    return {
+        "status": "success",
+        "messages": messages
+    }
+
+
 @app.post("/dispatch-email")
-def dispatch_email(
+async def dispatch_email(
     req: EmailDispatchRequest,
     current_user: User = Depends(get_current_user)
 ):
-    
-    sender_email = os.getenv("SMTP_EMAIL")
-    sender_password = os.getenv("SMTP_PASSWORD")
 
-    if not sender_email or not sender_password:
+    if mailer.simulated:
         print(f"⚠️ Simulation Mode: Would have sent email to {req.customer_email}")
         print(f"Offer: {req.offer_message}")
         return {
@@ -321,49 +501,70 @@ def dispatch_email(
         }
 
     try:
-        # Create HTML email
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = f"A Personalized Offer from FinPulse Bank"
-        msg["From"] = f"FinPulse Advisor <{sender_email}>"
-        msg["To"] = req.customer_email
-
-        html = f"""
-        <html>
-          <body style="font-family: Arial, sans-serif; background-color: #f4f7f6; padding: 20px;">
-            <div style="max-w-md mx-auto bg-white p-6 rounded-lg shadow-md border-t-4 border-blue-600">
-                <h2 style="color: #1e3a8a;">Hello {req.customer_name},</h2>
-                <p style="color: #475569; line-height: 1.6;">
-                    {req.offer_message}
-                </p>
-                <div style="margin-top: 30px; text-align: left;">
-                    <a href="https://finpulse-ai-iota.vercel.app/" style="background-color: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; font-weight: bold; display: inline-block;">
-                        Explore {req.product_name}
-                    </a>
-                </div>
-                <hr style="margin-top: 40px; border: none; border-top: 1px solid #e2e8f0;" />
-                <p style="color: #94a3b8; font-size: 12px; margin-top: 20px;">
-                    This is an AI-generated personalized offer sent by your FinPulse Advisor.
-                </p>
-            </div>
-          </body>
-        </html>
-        """
-        
-        msg.attach(MIMEText(html, "html"))
-
-        # Send via Gmail SMTP
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, req.customer_email, msg.as_string())
-
+        # submit records the job in email_jobs, so it runs off the loop
+        job = await run_in_threadpool(mailer.submit, [req.model_dump()], "single")
+    except queue.Full:
+        raise HTTPException(503, "Email queue is full, retry shortly", headers={"Retry-After": "5"})
+
+    # sent over a pooled connection by the mailer threads; if it is still
+    # queued or retrying after EMAIL_DISPATCH_WAIT it keeps going anyway
+    if not await job.wait_async(EMAIL_DISPATCH_WAIT):
         return {
-            "status": "success",
-            "message": f"Email successfully dispatched to {req.customer_email}"
+            "status": "queued",
+            "message": f"Email to {req.customer_email} queued for delivery",
+            "job_id": job.id
         }
-        
-    except Exception as e:
-        print(f"❌ Email Dispatch Failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+    if job.failed:
+        raise HTTPException(status_code=500, detail=job.errors[-1]["error"])
+
+    return {
+        "status": "success",
+        "message": f"Email successfully dispatched to {req.customer_email}"
+    }
+
+
+MAX_CAMPAIGN_SIZE = int(os.getenv("MAX_CAMPAIGN_SIZE", "50000"))
+
+
+@app.post("/campaigns/email", status_code=202)
+def create_email_campaign(
+    req: EmailCampaignRequest,
+    current_user: User = Depends(get_current_user)
+):
+
+    if not req.recipients:
+        raise HTTPException(400, "No recipients")
+
+    if len(req.recipients) > MAX_CAMPAIGN_SIZE:
+        raise HTTPException(400, f"At most {MAX_CAMPAIGN_SIZE} recipients per campaign")
+
+    try:
+        job = mailer.submit([r.model_dump() for r in req.recipients])
+    except queue.Full:
+        raise HTTPException(503, "Email queue is full, retry shortly", headers={"Retry-After": "30"})
+
+    return {
+        "status": "queued",
+        "job_id": job.id,
+        "total": job.total,
+        "simulated": mailer.simulated
+    }
+
+
+@app.get("/campaigns/email/{job_id}")
+def email_campaign_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+
+    # read from email_jobs, so any worker can answer
+    progress = mailer.progress(job_id)
+
+    if progress is None:
+        raise HTTPException(404, "Unknown campaign")
+
+    return progress
 
 
 # ========================
@@ -371,26 +572,127 @@ def dispatch_email(
 # ========================
 
 @app.get("/admin/distinct-users")
-def distinct_users(db: Session = Depends(get_db)):
+def distinct_users(
+    limit: int = MAX_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
 
-    logs = db.query(AuditLog.customer_id).distinct().all()
+    # one page per call; clients follow next_cursor until it is null
+    try:
+        ids, next_cursor = distinct_customers(db, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
     return {
         "distinct_users": [
-            {"user_id": log[0], "name": log[0]}
-            for log in logs
-        ]
+            {"user_id": customer_id, "name": customer_id}
+            for customer_id in ids
+        ],
+        "next_cursor": next_cursor
+    }
+
+
+@app.get("/admin/audit-logs")
+def audit_logs(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    customer_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    product: Optional[str] = None,
+    persona: Optional[str] = None,
+    guardrail: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+
+    try:
+        logs, next_cursor = query_audit_logs(
+            db, limit, cursor,
+            customer_id=customer_id,
+            employee_id=employee_id,
+            product=product,
+            persona=persona,
+            guardrail=guardrail,
+            start=start,
+            end=end
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    return {
+        "logs": logs,
+        "next_cursor": next_cursor
     }
 
 
 @app.get("/admin/product-stats")
-def product_stats(db: Session = Depends(get_db)):
+def product_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: str = "product",
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
 
-    logs = db.query(AuditLog).all()
+    dimensions = [g.strip() for g in group_by.split(",") if g.strip()]
 
-    products = Counter(l.product_recommended for l in logs)
+    unknown = [g for g in dimensions if g not in ROLLUP_DIMENSIONS]
+    if not dimensions or unknown:
+        raise HTTPException(400, f"group_by must be a comma-separated subset of {sorted(ROLLUP_DIMENSIONS)}")
 
-    return dict(products)
+    rows = rollup_stats(db, dimensions, start, end)
+
+    # default shape kept for the analytics dashboard: {product: count}
+    if dimensions == ["product"]:
+        return {row[0]: int(row[1]) for row in rows}
+
+    return {
+        "group_by": dimensions,
+        "rows": [
+            {
+                **{g: (v.isoformat() if isinstance(v, date) else v) for g, v in zip(dimensions, row[:-1])},
+                "count": int(row[-1])
+            }
+            for row in rows
+        ]
+    }
+
+
+@app.get("/admin/llm-status")
+def llm_status(admin: User = Depends(require_admin)):
+
+    # circuit breaker state, deadline and hedging thresholds
+    return llm.status()
+
+
+@app.get("/admin/profiles")
+def profiles(
+    limit: int = 50,
+    admin: User = Depends(require_admin)
+):
+
+    return {"profiles": list_profiles(limit)}
+
+
+@app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+def profile(
+    profile_id: str,
+    admin: User = Depends(require_admin)
+):
+
+    try:
+        content = read_profile(profile_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    if content is None:
+        raise HTTPException(404, "Profile not found")
+
+    return content
 
 
 # ========================
@@ -410,9 +712,17 @@ def health():
 
     return {
         "status": "healthy",
-        "service": "FinPulse AI"
+        "service": "FinPulse AI",
+        "llm": llm.breaker.state
     }
 
+
+@app.get("/metrics")
+def metrics():
+
+    # Prometheus text format; counters and histograms are per worker process
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/db-test")
 def db_test(db: Session = Depends(get_db)):
     try:
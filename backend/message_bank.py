@@ -0,0 +1,107 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ── Message Bank ──────────────────────────────────────────
+# Ready-made recommendation messages for every (persona, product, guardrail)
+# outcome the rule table can produce (RuleSet.outcomes), built once at
+# startup and served from memory, so analyze_user never waits on the LLM.
+# The personalised LLM message is produced afterwards by MessageEnricher
+# and picked up from the message cache when it is ready.
+
+PERSONA_OPENERS = {
+    "student":          "Investing in your education is a big step",
+    "spender":          "You make the most of every day",
+    "saver":            "Your steady saving habits really stand out",
+    "credit_dependent": "We're here to help keep your finances on track",
+    "general":          "Thanks for banking with us",
+}
+
+PRODUCT_PITCHES = {
+    "travel card":           "our travel card earns rewards on every trip and waives foreign fees.",
+    "cashback card":         "our cashback card pays you back on the things you already buy.",
+    "education loan":        "our education loan spreads tuition costs into easy repayments.",
+    "overdraft protection":  "overdraft protection keeps you covered when a payment lands early.",
+    "SIP investment":        "a SIP investment turns your monthly surplus into long-term growth.",
+    "recurring deposit":     "a recurring deposit grows your savings a little every month.",
+    "basic savings account": "our basic savings account is a simple, safe home for your money.",
+}
+
+BLOCKED_NOTE = " We picked it as the safest fit for your current balance."
+
+ENRICH_WORKERS     = int(os.getenv("ENRICH_WORKERS", "4"))
+ENRICH_MAX_PENDING = int(os.getenv("ENRICH_MAX_PENDING", "1000"))
+
+
+def template_message(persona, product, guardrail="passed"):
+    opener = PERSONA_OPENERS.get(persona)
+    pitch  = PRODUCT_PITCHES.get(product)
+    if opener is None or pitch is None:
+        message = f"Based on your profile, we recommend our {product} — perfectly suited for your lifestyle."
+    else:
+        message = f"{opener} — {pitch}"
+    return message + (BLOCKED_NOTE if guardrail == "blocked" else "")
+
+
+class MessageBank:
+
+    def __init__(self, ruleset):
+        self.version  = ruleset.version
+        self.messages = {
+            (persona, product, guardrail): template_message(persona, product, guardrail)
+            for persona, _, product, guardrail, _ in ruleset.outcomes()
+        }
+
+    def get(self, persona, product, guardrail="passed"):
+        # outcomes outside the bank (e.g. a hand-built behaviour) still get one
+        message = self.messages.get((persona, product, guardrail))
+        return message if message is not None else template_message(persona, product, guardrail)
+
+    def __len__(self):
+        return len(self.messages)
+
+
+class MessageEnricher:
+
+    # Runs generate(*args) (an LLM call that fills the message cache) on a
+    # small thread pool, at most once per key at a time. When more than
+    # ENRICH_MAX_PENDING keys are waiting, new ones are skipped and keep
+    # their template message.
+
+    def __init__(self, generate, workers=ENRICH_WORKERS, max_pending=ENRICH_MAX_PENDING):
+        self.generate    = generate
+        self.workers     = workers
+        self.max_pending = max_pending
+        self.skipped     = 0
+        self._pool       = None
+        self._pending    = {}
+        self._lock       = threading.Lock()
+
+    def submit(self, key, *args):
+        if self.workers <= 0:
+            return False
+        with self._lock:
+            if key in self._pending:
+                return True
+            if len(self._pending) >= self.max_pending:
+                self.skipped += 1
+                return False
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="llm-enrich")
+            future = self._pool.submit(self.generate, *args)
+            self._pending[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return True
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def is_pending(self, key):
+        return key in self._pending
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
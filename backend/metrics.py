@@ -0,0 +1,222 @@
+import bisect
+import threading
+import time
+
+# ── Metrics ───────────────────────────────────────────────
+# In-process counters and histograms rendered in the Prometheus text format
+# by GET /metrics. Recording is a bisect plus a couple of additions under a
+# per-metric lock, cheap enough to leave on for every request. Values are
+# per process; with several uvicorn workers each worker is scraped (or
+# summed) separately.
+#
+# Callbacks registered with register_callback are sampled at scrape time,
+# for numbers that other modules already keep (cache and queue stats).
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        '%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name    = name
+        self.help    = help
+        self.labels  = tuple(labels)
+        self._lock   = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class _Timer:
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels    = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Histogram:
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name    = name
+        self.help    = help
+        self.labels  = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock   = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1]    += value
+            series[2]    += 1
+
+    def time(self, *labels):
+        # with STAGE_SECONDS.time("rules"): ...
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                yield (self.name + "_bucket",
+                       _format_labels((*self.labels, "le"), (*labels, _format_value(bound))),
+                       cumulative)
+            yield self.name + "_sum", _format_labels(self.labels, labels), total
+            yield self.name + "_count", _format_labels(self.labels, labels), count
+
+
+class Callback:
+
+    def __init__(self, name, help, kind, labels, fn):
+        self.name   = name
+        self.help   = help
+        self.kind   = kind
+        self.labels = tuple(labels)
+        self.fn     = fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            if not isinstance(labels, tuple):
+                labels = (labels,)
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock    = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def register_callback(self, name, help, fn, kind="gauge", labels=()):
+        # fn() returns a number, or {label value(s): number}
+        return self.register(Callback(name, help, kind, labels, fn))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = registry.histogram(
+    "finpulse_stage_seconds", "Time spent per processing stage", ("stage",))
+ROUTE_SECONDS = registry.histogram(
+    "finpulse_http_request_seconds", "HTTP request latency by route", ("method", "route", "status"))
+LLM_REQUESTS = registry.counter(
+    "finpulse_llm_requests_total", "LLM completions by outcome", ("outcome",))
+LLM_FALLBACKS = registry.counter(
+    "finpulse_llm_fallbacks_total", "Template messages served after an LLM failure")
+
+
+# ── Route Latency Middleware ──────────────────────────────
+# Plain ASGI middleware: times every HTTP request and labels it with the
+# matched route template (not the raw path), so label cardinality stays
+# bounded by the number of routes.
+
+class MetricsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status  = [500]
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            ROUTE_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status[0],
+            )
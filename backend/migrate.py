@@ -0,0 +1,54 @@
+from sqlalchemy.orm import Session
+from database import SessionLocal, create_tables, User
+from passwords import hash_password
+from employee_ids import employee_ids
+from audit_stats import ensure_rollups
+
+# ── Migrations ────────────────────────────────────────────
+# One-time database setup, run once per deploy instead of on every boot:
+#
+#   python migrate.py
+#
+# Creates missing tables and indexes, seeds the default admin, prepares the
+# employee ID sequence / counter and backfills audit rollups. Every step is
+# idempotent. The API's startup hook also runs it when a table is missing
+# (MIGRATE_ON_STARTUP=auto, the default); true runs it on every start.
+
+
+def create_default_admin(db: Session):
+
+    admin = db.query(User).filter(User.role == "admin").first()
+
+    if admin:
+        return
+
+    admin_user = User(
+        employee_id="EMP000",
+        name="System Admin",
+        email="admin@finpulse.ai",
+        password_hash=hash_password("admin123"),
+        role="admin"
+    )
+
+    db.add(admin_user)
+    db.commit()
+
+    print("✅ Default admin created")
+
+
+def migrate():
+    create_tables()
+
+    db = SessionLocal()
+    try:
+        create_default_admin(db)
+        ensure_rollups(db)
+    finally:
+        db.close()
+
+    employee_ids.ensure()
+
+
+if __name__ == "__main__":
+    migrate()
+    print("✅ Database ready")
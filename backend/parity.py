@@ -0,0 +1,261 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+# ── Scoring Parity Check ──────────────────────────────────
+# Scores a synthetic portfolio three ways and fails (exit 1) unless every
+# user gets the same result from all of them:
+#
+#   reference    the original per-user Functions 2-8, frozen below
+#   score_user   the per-user path (store totals + compiled rule table)
+#   analyze_users the batch path (grouped totals + RuleSet.evaluate_columns)
+#
+# Run it after touching detect_behaviour, the batch scoring code or
+# rules.json; a rule-table change that alters results must also change the
+# reference, on purpose.
+#
+#   python parity.py --users 2000 --rows 40000
+#   python parity.py --users 2000 --rows 40000 --columnar
+
+FIELDS = ("persona", "life_event", "product", "confidence", "reason", "guardrail", "guardrail_note")
+
+
+# ── Reference Implementation ──────────────────────────────
+# Functions 2-8 as they were before the rule table; do not edit to make a
+# comparison pass.
+
+def reference_behaviour(transactions):
+    food          = sum(1 for t in transactions if t["category"] == "Food")
+    travel        = sum(1 for t in transactions if t["category"] == "Travel")
+    salary        = sum(1 for t in transactions if t["category"] == "Salary")
+    education     = sum(1 for t in transactions if t["category"] == "Education")
+    rent          = sum(1 for t in transactions if t["category"] == "Rent")
+    shopping      = sum(1 for t in transactions if t["category"] == "Shopping")
+    entertainment = sum(1 for t in transactions if t["category"] == "Entertainment")
+
+    credits  = [t["amount"] for t in transactions if t["type"] == "credit"]
+    debits   = [t["amount"] for t in transactions if t["type"] == "debit"]
+
+    total_spent  = sum(debits)
+    total_income = sum(credits)
+    low_balance  = (total_income - total_spent) < 500
+
+    return {
+        "food_count":           food,
+        "travel_count":         travel,
+        "salary_detected":      salary > 0,
+        "education_count":      education,
+        "rent_count":           rent,
+        "shopping_count":       shopping,
+        "entertainment_count":  entertainment,
+        "total_spent":          round(total_spent, 2),
+        "total_income":         round(total_income, 2),
+        "low_balance":          low_balance,
+        "food_spending":        "high" if food > 5 else "low",
+        "is_traveler":          travel > 3,
+    }
+
+
+def reference_life_event(behaviour):
+    if behaviour["education_count"] >= 2:
+        return "higher_education"
+    if behaviour["is_traveler"]:
+        return "frequent_traveler"
+    if behaviour["rent_count"] >= 2:
+        return "renter"
+    if behaviour["salary_detected"]:
+        return "employed"
+    return "unknown"
+
+
+def reference_persona(behaviour, life_event):
+    if life_event == "higher_education":
+        return "student"
+    if behaviour["low_balance"] and behaviour["salary_detected"]:
+        return "credit_dependent"
+    if behaviour["food_spending"] == "high" or behaviour["is_traveler"] or behaviour["shopping_count"] > 5:
+        return "spender"
+    if not behaviour["low_balance"] and behaviour["salary_detected"]:
+        return "saver"
+    return "general"
+
+
+def reference_product(persona, life_event):
+    if life_event == "frequent_traveler":
+        return "travel card"
+    mapping = {
+        "spender":          "cashback card",
+        "student":          "education loan",
+        "credit_dependent": "overdraft protection",
+        "saver":            "SIP investment",
+        "general":          "basic savings account"
+    }
+    return mapping.get(persona, "basic savings account")
+
+
+def reference_confidence(behaviour, persona, life_event):
+    score = 0
+    if behaviour["salary_detected"]:         score += 30
+    if behaviour["food_count"] > 10:         score += 40
+    elif behaviour["food_count"] > 5:        score += 20
+    if behaviour["is_traveler"]:             score += 20
+    if behaviour["education_count"] >= 2:    score += 30
+    if behaviour["rent_count"] >= 2:         score += 20
+    if behaviour["shopping_count"] > 5:      score += 15
+    if life_event != "unknown":              score += 20
+    if persona != "general":                 score += 10
+    return min(score, 100)
+
+
+def reference_guardrail(persona, behaviour, product):
+    blocked       = False
+    reason        = "all checks passed"
+    final_product = product
+
+    if behaviour["low_balance"] and product in ["education loan", "overdraft protection"]:
+        blocked       = True
+        final_product = "basic savings account"
+        reason        = "blocked: low balance — safer product assigned"
+
+    if product == "travel card" and not behaviour["is_traveler"]:
+        blocked       = True
+        final_product = "cashback card"
+        reason        = "blocked: travel card not suitable — cashback assigned"
+
+    if product == "SIP investment" and behaviour["low_balance"]:
+        blocked       = True
+        final_product = "recurring deposit"
+        reason        = "blocked: low balance — recurring deposit suggested instead"
+
+    return {
+        "guardrail":        "blocked" if blocked else "passed",
+        "guardrail_reason": reason,
+        "final_product":    final_product
+    }
+
+
+def reference_reason(behaviour, persona, life_event):
+    parts = []
+    if behaviour["food_count"] > 5:
+        parts.append(f"frequent food transactions ({behaviour['food_count']} times)")
+    if behaviour["is_traveler"]:
+        parts.append(f"travel spending detected ({behaviour['travel_count']} trips)")
+    if behaviour["education_count"] >= 2:
+        parts.append(f"education payments found ({behaviour['education_count']} times)")
+    if behaviour["low_balance"]:
+        parts.append("low balance detected")
+    if behaviour["salary_detected"]:
+        parts.append("regular salary income confirmed")
+    if behaviour["shopping_count"] > 5:
+        parts.append(f"high shopping activity ({behaviour['shopping_count']} transactions)")
+    if behaviour["rent_count"] >= 2:
+        parts.append(f"regular rent payments ({behaviour['rent_count']} times)")
+
+    reason = ", ".join(parts) if parts else "general spending pattern observed"
+    return f"User identified as {persona} due to: {reason}."
+
+
+def reference_score(transactions):
+    behaviour  = reference_behaviour(transactions)
+    life_event = reference_life_event(behaviour)
+    persona    = reference_persona(behaviour, life_event)
+    product    = reference_product(persona, life_event)
+    guardrail  = reference_guardrail(persona, behaviour, product)
+    return {
+        "persona":        persona,
+        "life_event":     life_event,
+        "product":        guardrail["final_product"],
+        "confidence":     reference_confidence(behaviour, persona, life_event),
+        "reason":         reference_reason(behaviour, persona, life_event),
+        "guardrail":      guardrail["guardrail"],
+        "guardrail_note": guardrail["guardrail_reason"],
+    }
+
+
+def reference_portfolio(csv_path, account_to_user, category_map):
+    # the original CSV load (Function 1), grouped once instead of per user
+    df = pd.read_csv(csv_path)
+    df["user_id"]  = df["Account Name"].map(account_to_user)
+    df["category"] = df["Category"].map(category_map).fillna("Other")
+    df = df.rename(columns={"Amount": "amount", "Transaction Type": "type"})
+    df = df[df["user_id"].notna()]
+    return {
+        user_id: reference_score(rows[["amount", "category", "type"]].to_dict(orient="records"))
+        for user_id, rows in df.groupby("user_id", sort=True)
+    }
+
+
+# ── Comparison ────────────────────────────────────────────
+
+def diff(expected, actual):
+    return {
+        f: (expected[f], actual.get(f)) for f in FIELDS
+        if expected[f] != actual.get(f)
+    }
+
+
+def check(users, rows, seed, use_columnar, show):
+    os.environ["LIVE_AGGREGATES"] = "memory"
+    os.environ["INGEST_JOURNAL_PATH"] = ""
+    import engine
+    import synth
+
+    workdir  = tempfile.mkdtemp(prefix="finpulse-parity-")
+    csv_path = os.path.join(workdir, "transactions.csv")
+    synth.write_transactions(csv_path, users, rows, seed=seed)
+    engine.ACCOUNT_TO_USER.update(synth.account_map(users))
+
+    path = csv_path
+    if use_columnar:
+        import columnar
+        path = os.path.join(workdir, "transactions.arrow")
+        columnar.convert(csv_path, path)
+    engine.TRANSACTIONS_PATH = path
+
+    expected = reference_portfolio(csv_path, engine.ACCOUNT_TO_USER, engine.CATEGORY_MAP)
+    batch    = {row["user_id"]: row for row in engine.analyze_users(path=path).to_dict(orient="records")}
+
+    mismatches = 0
+    for user_id, want in expected.items():
+        for label, got in (("score_user", engine.score_user(user_id)), ("analyze_users", batch.get(user_id))):
+            delta = {"missing": (want, None)} if got is None else diff(want, got)
+            if delta:
+                mismatches += 1
+                if mismatches <= show:
+                    print(f"  {label} {user_id}: {delta}")
+
+    extra = sorted(set(batch) - set(expected))
+    if extra:
+        mismatches += len(extra)
+        print(f"  analyze_users scored users the reference did not: {extra[:show]}")
+
+    personas = pd.Series([r["persona"] for r in expected.values()]).value_counts().to_dict()
+    print(f"{len(expected):,} users from {rows:,} rows ({'columnar' if use_columnar else 'csv'}), "
+          f"personas {personas}")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check per-user and batch scoring against the reference rules.")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=40_000, help="few rows per user keeps counts near the thresholds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--columnar", action="store_true", help="also score from a columnar copy of the file")
+    parser.add_argument("--show", type=int, default=10, help="mismatches to print")
+    args = parser.parse_args(argv)
+
+    mismatches = check(args.users, args.rows, args.seed, False, args.show)
+    if args.columnar:
+        mismatches += check(args.users, args.rows, args.seed, True, args.show)
+
+    if mismatches:
+        print(f"❌ {mismatches} mismatches", file=sys.stderr)
+        sys.exit(1)
+    print("✅ all paths match the reference")
+
+
+if __name__ == "__main__":
+    main()
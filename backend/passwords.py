@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+# ── Password Hashing Pool ─────────────────────────────────
+# bcrypt is CPU-bound and holds the GIL, so the async helpers below run it
+# on a dedicated process pool (HASH_WORKERS processes, 0 = the default
+# threadpool). At most HASH_QUEUE_SIZE hashes may be queued or running;
+# beyond that callers get PoolBusy instead of piling up behind a burst.
+# Workers are started with forkserver (spawn where unavailable), never by
+# forking the threaded server, and the forkserver preloads only this
+# module, which depends on nothing but passlib, so they start cheaply.
+# As with any non-fork pool, scripts using it need an
+# `if __name__ == "__main__":` guard (uvicorn's entry points have one).
+
+HASH_WORKERS      = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_SIZE   = int(os.getenv("HASH_QUEUE_SIZE", "256"))
+HASH_START_METHOD = os.getenv(
+    "HASH_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    password = password[:72]
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    plain_password = plain_password[:72]
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _mp_context():
+    context = multiprocessing.get_context(HASH_START_METHOD)
+    if HASH_START_METHOD == "forkserver":
+        # preload only this module, not the server's __main__
+        context.set_forkserver_preload([__name__])
+    return context
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class HashPool:
+
+    def __init__(self, workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE):
+        self.workers    = workers
+        self.queue_size = queue_size
+        self._executor  = None
+        self._lock      = threading.Lock()
+        self._pending   = 0
+
+    def _get_executor(self):
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+        return self._executor
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.queue_size:
+                raise PoolBusy("password hashing queue is full")
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+hash_pool = HashPool()
+
+
+async def hash_password_async(password: str) -> str:
+    return await hash_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hash_pool.run(verify_password, plain_password, hashed_password)
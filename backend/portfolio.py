@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+
+import columnar
+import engine
+
+# ── Portfolio Scoring CLI ─────────────────────────────────
+# Scores every customer in a transactions file across a process pool and
+# streams one JSON object per user as soon as its chunk finishes:
+#
+#   python portfolio.py data/transactions.csv --workers 8 --output scores.ndjson
+#
+# Only a bounded number of chunks are in flight at once and the parent
+# reads nothing but the user column, so its memory stays flat regardless
+# of portfolio size. Each worker parses a CSV once, on its first chunk;
+# for large portfolios convert it with columnar.py first, so workers
+# memory-map one shared file instead.
+
+def list_users(path, chunk_rows=500_000):
+    # reads only the user column (streamed for CSV), never the whole file;
+    # sorted, like the store's own order
+    if columnar.is_columnar(path):
+        return columnar.read_user_ids(path)
+    users = set()
+    for accounts in pd.read_csv(path, usecols=["Account Name"], dtype="category", chunksize=chunk_rows):
+        users.update(accounts["Account Name"].cat.categories.map(engine.ACCOUNT_TO_USER).dropna())
+    return sorted(users)
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def score_chunk(path, user_ids, with_message):
+    # analyze_users aggregates only this chunk's rows, so work per worker
+    # follows the chunk size rather than the portfolio size
+    rows   = engine.get_transaction_store(path).row_count(user_ids)
+    result = engine.analyze_users(user_ids, path=path, with_message=with_message)
+    return rows, result.to_dict(orient="records")
+
+def _json_default(value):
+    # numpy scalars that slipped through to_dict
+    return value.item()
+
+def _emit(future, out):
+    rows, records = future.result()
+    for record in records:
+        out.write(json.dumps(record, default=_json_default) + "\n")
+    out.flush()
+    return rows, len(records)
+
+def run(path, workers, out, chunk_size=500, with_message=False):
+    users   = list_users(path)
+    chunks  = chunked(users, chunk_size)
+    rows    = 0
+    scored  = 0
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(score_chunk, path, chunk, with_message))
+            if len(pending) < workers * 2:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                n, m = _emit(future, out)
+                rows, scored = rows + n, scored + m
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                n, m = _emit(future, out)
+                rows, scored = rows + n, scored + m
+
+    elapsed = time.perf_counter() - started
+    return {
+        "users":         scored,
+        "rows":          rows,
+        "seconds":       round(elapsed, 3),
+        "rows_per_sec":  round(rows / elapsed, 1) if elapsed else 0.0,
+        "users_per_sec": round(scored / elapsed, 1) if elapsed else 0.0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score every customer in a transactions file.")
+    parser.add_argument("transactions", help="path to the transactions CSV")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", "-o", default="-", help="NDJSON output file, '-' for stdout")
+    parser.add_argument("--chunk-size", type=int, default=500, help="users per worker task")
+    parser.add_argument("--with-message", action="store_true", help="also generate the LLM message")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        stats = run(args.transactions, args.workers, out, args.chunk_size, args.with_message)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(
+        f"Scored {stats['users']} users / {stats['rows']} rows in {stats['seconds']}s "
+        f"({stats['users_per_sec']} users/sec, {stats['rows_per_sec']} rows/sec)",
+        file=sys.stderr
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs
+from starlette.concurrency import run_in_threadpool
+
+# ── Per-request Profiling ─────────────────────────────────
+# An admin can profile a single request by sending "X-Profile: 1" or adding
+# "?profile=1". While that request runs, a sampling thread records the stack
+# of every thread each PROFILE_INTERVAL seconds (the event loop and the
+# threadpool running sync routes alike). The samples are written to
+# PROFILE_DIR in collapsed-stack format (flamegraph.pl / speedscope), the
+# response carries an X-Profile-Id header, and GET /admin/profiles/{id}
+# returns the file.
+#
+# Requests without the flag only pay for the flag check; non-admin tokens
+# asking for a profile are served normally and not profiled. Samples from
+# concurrent requests on the same worker show up in the profile too, under
+# their own thread names.
+
+PROFILE_DIR      = os.getenv("PROFILE_DIR", "data/profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_KEEP     = int(os.getenv("PROFILE_KEEP", "200"))
+
+HEADER   = b"x-profile"
+ID_RE    = re.compile(r"^[0-9T]+-[0-9a-f]{8}$")
+_ENABLED = {"1", "true", "yes", "on"}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks   = Counter()
+        self.samples  = 0
+        self._done    = threading.Event()
+
+    def run(self):
+        me    = threading.get_ident()
+        names = {}
+        while not self._done.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names.update((t.ident, f"thread:{t.name}") for t in threading.enumerate())
+                name = names.get(ident, f"thread:{ident}")
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def requested(scope):
+    query = scope.get("query_string", b"")
+    if b"profile" in query:
+        values = parse_qs(query.decode("latin-1")).get("profile", [])
+        if any(v.lower() in _ENABLED for v in values):
+            return True
+    for name, value in scope.get("headers", ()):
+        if name == HEADER:
+            return value.decode("latin-1").lower() in _ENABLED
+    return False
+
+
+def _bearer_token(scope):
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" else None
+    return None
+
+
+def new_profile_id():
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def profile_path(profile_id):
+    if not ID_RE.match(profile_id):
+        raise ValueError("Invalid profile id")
+    return os.path.join(PROFILE_DIR, f"{profile_id}.txt")
+
+
+def write_profile(profile_id, meta, stacks):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = profile_path(profile_id)
+    with open(path, "w") as f:
+        for key, value in meta.items():
+            f.write(f"# {key}: {value}\n")
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    _prune()
+    return path
+
+
+def _prune():
+    names = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith(".txt"))
+    for name in names[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+def read_meta(path):
+    meta = {}
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("# "):
+                break
+            key, _, value = line[2:].rstrip("\n").partition(": ")
+            meta[key] = value
+    return meta
+
+
+def list_profiles(limit=50):
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith(".txt")), reverse=True)
+    return [
+        {"id": name[:-4], **read_meta(os.path.join(PROFILE_DIR, name))}
+        for name in names[:limit]
+    ]
+
+
+def read_profile(profile_id):
+    path = profile_path(profile_id)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read()
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, app, is_admin):
+        # is_admin(token) -> bool, checked only for flagged requests; it and
+        # write_profile hit the DB and disk, so both run off the event loop
+        self.app      = app
+        self.is_admin = is_admin
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not requested(scope):
+            return await self.app(scope, receive, send)
+
+        token = _bearer_token(scope)
+        if not token or not await run_in_threadpool(self.is_admin, token):
+            return await self.app(scope, receive, send)
+
+        profile_id = new_profile_id()
+        status     = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = [*message.get("headers", []),
+                                      (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = Sampler()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            await run_in_threadpool(write_profile, profile_id, {
+                "method":      scope["method"],
+                "path":        scope["path"],
+                "status":      status[0],
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "samples":     sampler.samples,
+                "interval_ms": PROFILE_INTERVAL * 1000,
+            }, sampler.stacks)
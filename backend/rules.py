@@ -0,0 +1,465 @@
+import json
+import operator
+import os
+import string
+
+import numpy as np
+
+# ── Rule Engine ───────────────────────────────────────────
+# The life-event, persona, product, confidence, guardrail and reason rules
+# live in a versioned table (DEFAULT_RULES below, or a JSON file named by
+# RULES_PATH) and are compiled once into a RuleSet. Every condition is
+# compiled to both a scalar check on a dict and a mask over column arrays,
+# so the per-user path and batch scoring evaluate exactly the same rules.
+#
+# A condition is a list of clauses that must all hold. A clause is either
+# [field, op, value] or {"any": [clause, ...]}. Fields are behaviour
+# features plus the outputs of earlier stages (life_event, persona,
+# product).
+
+OPERATORS = {
+    "==":     operator.eq,
+    "!=":     operator.ne,
+    ">":      operator.gt,
+    ">=":     operator.ge,
+    "<":      operator.lt,
+    "<=":     operator.le,
+    "in":     lambda a, b: a in b,
+    "not in": lambda a, b: a not in b,
+}
+
+DEFAULT_RULES = {
+    "version": "2026.1",
+
+    # first match wins
+    "life_event": {
+        "rules": [
+            {"when": [["education_count", ">=", 2]], "then": "higher_education"},
+            {"when": [["is_traveler", "==", True]], "then": "frequent_traveler"},
+            {"when": [["rent_count", ">=", 2]], "then": "renter"},
+            {"when": [["salary_detected", "==", True]], "then": "employed"},
+        ],
+        "default": "unknown",
+    },
+
+    # first match wins
+    "persona": {
+        "rules": [
+            {"when": [["life_event", "==", "higher_education"]], "then": "student"},
+            {"when": [["low_balance", "==", True], ["salary_detected", "==", True]], "then": "credit_dependent"},
+            {"when": [{"any": [
+                ["food_spending", "==", "high"],
+                ["is_traveler", "==", True],
+                ["shopping_count", ">", 5],
+            ]}], "then": "spender"},
+            {"when": [["low_balance", "==", False], ["salary_detected", "==", True]], "then": "saver"},
+        ],
+        "default": "general",
+    },
+
+    # first match wins
+    "product": {
+        "rules": [
+            {"when": [["life_event", "==", "frequent_traveler"]], "then": "travel card"},
+            {"when": [["persona", "==", "spender"]], "then": "cashback card"},
+            {"when": [["persona", "==", "student"]], "then": "education loan"},
+            {"when": [["persona", "==", "credit_dependent"]], "then": "overdraft protection"},
+            {"when": [["persona", "==", "saver"]], "then": "SIP investment"},
+        ],
+        "default": "basic savings account",
+    },
+
+    # every matching rule adds its points, capped
+    "confidence": {
+        "rules": [
+            {"when": [["salary_detected", "==", True]], "add": 30},
+            {"when": [["food_count", ">", 10]], "add": 40},
+            {"when": [["food_count", ">", 5], ["food_count", "<=", 10]], "add": 20},
+            {"when": [["is_traveler", "==", True]], "add": 20},
+            {"when": [["education_count", ">=", 2]], "add": 30},
+            {"when": [["rent_count", ">=", 2]], "add": 20},
+            {"when": [["shopping_count", ">", 5]], "add": 15},
+            {"when": [["life_event", "!=", "unknown"]], "add": 20},
+            {"when": [["persona", "!=", "general"]], "add": 10},
+        ],
+        "cap": 100,
+    },
+
+    # checked in order against the recommended product; a later match
+    # overrides an earlier one
+    "guardrail": {
+        "rules": [
+            {"when": [["low_balance", "==", True], ["product", "in", ["education loan", "overdraft protection"]]],
+             "product": "basic savings account",
+             "reason": "blocked: low balance — safer product assigned"},
+            {"when": [["product", "==", "travel card"], ["is_traveler", "==", False]],
+             "product": "cashback card",
+             "reason": "blocked: travel card not suitable — cashback assigned"},
+            {"when": [["product", "==", "SIP investment"], ["low_balance", "==", True]],
+             "product": "recurring deposit",
+             "reason": "blocked: low balance — recurring deposit suggested instead"},
+        ],
+        "passed": "all checks passed",
+    },
+
+    # every matching part is listed, in order
+    "reason": {
+        "rules": [
+            {"when": [["food_count", ">", 5]], "text": "frequent food transactions ({food_count} times)"},
+            {"when": [["is_traveler", "==", True]], "text": "travel spending detected ({travel_count} trips)"},
+            {"when": [["education_count", ">=", 2]], "text": "education payments found ({education_count} times)"},
+            {"when": [["low_balance", "==", True]], "text": "low balance detected"},
+            {"when": [["salary_detected", "==", True]], "text": "regular salary income confirmed"},
+            {"when": [["shopping_count", ">", 5]], "text": "high shopping activity ({shopping_count} transactions)"},
+            {"when": [["rent_count", ">=", 2]], "text": "regular rent payments ({rent_count} times)"},
+        ],
+        "default": "general spending pattern observed",
+        "template": "User identified as {persona} due to: {reason}.",
+    },
+}
+
+
+class RuleError(ValueError):
+    pass
+
+
+# ── Compilation ───────────────────────────────────────────
+
+def _compile_clause(clause):
+    if isinstance(clause, dict):
+        if set(clause) != {"any"}:
+            raise RuleError(f"unsupported clause {clause!r}")
+        parts = [_compile_clause(c) for c in clause["any"]]
+
+        def scalar(ctx):
+            return any(p[0](ctx) for p in parts)
+
+        def vector(cols, n):
+            mask = np.zeros(n, dtype=bool)
+            for p in parts:
+                mask |= p[1](cols, n)
+            return mask
+
+        return scalar, vector
+
+    try:
+        field, op, value = clause
+    except (TypeError, ValueError):
+        raise RuleError(f"clause must be [field, op, value], got {clause!r}")
+    if op not in OPERATORS:
+        raise RuleError(f"unknown operator {op!r}")
+    fn = OPERATORS[op]
+
+    if op in ("in", "not in"):
+        value   = list(value)
+        negate  = op == "not in"
+
+        def vector(cols, n):
+            mask = np.isin(cols[field], value)
+            return ~mask if negate else mask
+    else:
+        def vector(cols, n):
+            return np.asarray(fn(cols[field], value), dtype=bool)
+
+    def scalar(ctx):
+        return fn(ctx[field], value)
+
+    return scalar, vector
+
+
+def _clause_terms(clause):
+    # the [field, op, value] leaves of a clause
+    if isinstance(clause, dict):
+        for c in clause["any"]:
+            yield from _clause_terms(c)
+    else:
+        yield clause
+
+
+def _probe_values(values):
+    # inputs on both sides of every compared value
+    probes = set()
+    for value in values:
+        if isinstance(value, bool):
+            probes |= {True, False}
+        elif isinstance(value, (int, float)):
+            probes |= {value - 1, value, value + 1}
+        elif isinstance(value, (list, tuple)):
+            probes |= set(_probe_values(value)) | {"\x00other"}
+        else:
+            probes |= {value, "\x00other"}
+    return sorted(probes, key=repr)
+
+
+def _force(domains, known, clause, want):
+    # domains narrowed so that clause evaluates to `want`, or None when no
+    # remaining value can. known holds fixed stage outputs (persona, ...),
+    # domains the probe values still open for each compared field.
+    if isinstance(clause, dict):
+        if want:
+            # any part may hold; narrow only when exactly one still can
+            options = [d for d in (_force(domains, known, c, True) for c in clause["any"]) if d is not None]
+            if not options:
+                return None
+            return options[0] if len(options) == 1 else domains
+        for c in clause["any"]:
+            domains = _force(domains, known, c, False)
+            if domains is None:
+                return None
+        return domains
+
+    field, op, value = clause
+    fn = OPERATORS[op]
+    if field in known:
+        return domains if bool(fn(known[field], value)) == want else None
+    kept = [v for v in domains[field] if bool(fn(v, value)) == want]
+    return {**domains, field: kept} if kept else None
+
+
+def _narrow(domains, known, clauses, holds):
+    # domains under which the condition holds (or fails), None if it cannot
+    if holds:
+        for clause in clauses:
+            domains = _force(domains, known, clause, True)
+            if domains is None:
+                return None
+        return domains
+    # failing needs one clause to fail; narrow only when just one can
+    options = [d for d in (_force(domains, known, c, False) for c in clauses) if d is not None]
+    if not options:
+        return None
+    return options[0] if len(options) == 1 else domains
+
+
+def _compile_condition(clauses):
+    parts = [_compile_clause(c) for c in clauses]
+
+    def scalar(ctx):
+        return all(p[0](ctx) for p in parts)
+
+    def vector(cols, n):
+        mask = np.ones(n, dtype=bool)
+        for p in parts:
+            mask &= p[1](cols, n)
+        return mask
+
+    return scalar, vector
+
+
+def _compile_template(template):
+    # [(literal, field or None), ...] for scalar and column-wise formatting
+    return [(literal, field) for literal, field, _, _ in string.Formatter().parse(template)]
+
+
+def _format_scalar(parts, ctx):
+    return "".join(literal + ("" if field is None else str(ctx[field])) for literal, field in parts)
+
+
+def _format_vector(parts, cols, n):
+    out = np.full(n, "", dtype=object)
+    for literal, field in parts:
+        out = out + literal
+        if field is not None:
+            out = out + np.asarray(cols[field]).astype(str).astype(object)
+    return out
+
+
+class RuleSet:
+
+    STAGES = ("life_event", "persona", "product", "confidence", "guardrail", "reason")
+
+    def __init__(self, table):
+        missing = [s for s in self.STAGES if s not in table]
+        if missing:
+            raise RuleError(f"rule table is missing stages {missing}")
+        self.table   = table
+        self.version = str(table.get("version", "unversioned"))
+
+        self._first_match = {
+            stage: (
+                [(_compile_condition(r["when"]), r["then"]) for r in table[stage]["rules"]],
+                table[stage]["default"],
+            )
+            for stage in ("life_event", "persona", "product")
+        }
+        self._confidence = (
+            [(_compile_condition(r["when"]), r["add"]) for r in table["confidence"]["rules"]],
+            table["confidence"].get("cap"),
+        )
+        self._guardrail = (
+            [(_compile_condition(r["when"]), r["product"], r["reason"]) for r in table["guardrail"]["rules"]],
+            table["guardrail"]["passed"],
+        )
+        self._reason = (
+            [(_compile_condition(r["when"]), _compile_template(r["text"])) for r in table["reason"]["rules"]],
+            table["reason"]["default"],
+            _compile_template(table["reason"]["template"]),
+        )
+
+    # ── scalar evaluation on one context dict ──
+
+    def first_match(self, stage, ctx):
+        rules, default = self._first_match[stage]
+        for (check, _), value in rules:
+            if check(ctx):
+                return value
+        return default
+
+    def confidence(self, ctx):
+        rules, cap = self._confidence
+        score = sum(points for (check, _), points in rules if check(ctx))
+        return min(score, cap) if cap is not None else score
+
+    def guardrail(self, ctx):
+        rules, passed = self._guardrail
+        blocked, reason, final_product = False, passed, ctx["product"]
+        for (check, _), product, note in rules:
+            if check(ctx):
+                blocked, reason, final_product = True, note, product
+        return {
+            "guardrail":        "blocked" if blocked else "passed",
+            "guardrail_reason": reason,
+            "final_product":    final_product
+        }
+
+    def reason(self, ctx):
+        rules, default, template = self._reason
+        parts  = [_format_scalar(text, ctx) for (check, _), text in rules if check(ctx)]
+        joined = ", ".join(parts) if parts else default
+        return _format_scalar(template, {**ctx, "reason": joined})
+
+    def outcomes(self):
+        # Every (persona, life_event, product, guardrail, guardrail_note) the
+        # table can produce, derived rule by rule: a first-match stage ends
+        # on one of its rules (it holds, every earlier one fails) or on its
+        # default, and the guardrail on its last matching rule or none. Each
+        # step narrows the values still open to every compared field (both
+        # sides of each compared value) and drops paths left with none, so
+        # the work follows the number of rule paths, not a grid over all
+        # fields. Conditions that span fields are only partly narrowed and
+        # derived features vary independently, so this may include a few
+        # combinations real behaviour never reaches, but never misses one
+        # that it does.
+        compared = {}
+        for stage in ("life_event", "persona", "product", "guardrail"):
+            for rule in self.table[stage]["rules"]:
+                for clause in rule["when"]:
+                    for field, _, value in _clause_terms(clause):
+                        if field not in ("life_event", "persona", "product"):
+                            compared.setdefault(field, []).append(value)
+        domains = {field: _probe_values(values) for field, values in compared.items()}
+
+        found = set()
+        for life_event, d1 in self._paths("life_event", domains, {}):
+            for persona, d2 in self._paths("persona", d1, {"life_event": life_event}):
+                known = {"life_event": life_event, "persona": persona}
+                for product, d3 in self._paths("product", d2, known):
+                    for final_product, guardrail, note in self._guardrail_paths(d3, {**known, "product": product}):
+                        found.add((persona, life_event, final_product, guardrail, note))
+        return sorted(found)
+
+    def _paths(self, stage, domains, known):
+        # (value, domains) for each way a first-match stage can resolve
+        rest = domains
+        for rule in self.table[stage]["rules"]:
+            held = _narrow(rest, known, rule["when"], True)
+            if held is not None:
+                yield rule["then"], held
+            rest = _narrow(rest, known, rule["when"], False)
+            if rest is None:
+                return
+        yield self.table[stage]["default"], rest
+
+    def _guardrail_paths(self, domains, known):
+        # (final_product, guardrail, note): the last matching rule wins
+        rules = self.table["guardrail"]["rules"]
+        for i, rule in enumerate(rules + [None]):
+            d = domains if rule is None else _narrow(domains, known, rule["when"], True)
+            for later in rules[i + 1:] if rule is not None else rules:
+                if d is None:
+                    break
+                d = _narrow(d, known, later["when"], False)
+            if d is None:
+                continue
+            if rule is None:
+                yield known["product"], "passed", self.table["guardrail"]["passed"]
+            else:
+                yield rule["product"], "blocked", rule["reason"]
+
+    # ── column-wise evaluation on a dict of equal-length arrays ──
+
+    def first_match_vector(self, stage, cols, n):
+        rules, default = self._first_match[stage]
+        if not rules:
+            return np.full(n, default, dtype=object)
+        return np.select(
+            [check(cols, n) for (_, check), _ in rules],
+            [value for _, value in rules],
+            default
+        ).astype(object)
+
+    def confidence_vector(self, cols, n):
+        rules, cap = self._confidence
+        score = np.zeros(n, dtype=np.int64)
+        for (_, check), points in rules:
+            score += np.where(check(cols, n), points, 0)
+        return np.minimum(score, cap) if cap is not None else score
+
+    def guardrail_vector(self, cols, n):
+        rules, passed = self._guardrail
+        blocked       = np.zeros(n, dtype=bool)
+        reason        = np.full(n, passed, dtype=object)
+        final_product = np.asarray(cols["product"], dtype=object).copy()
+        for (_, check), product, note in rules:
+            mask           = check(cols, n)
+            blocked       |= mask
+            reason         = np.where(mask, note, reason)
+            final_product  = np.where(mask, product, final_product)
+        return np.where(blocked, "blocked", "passed").astype(object), reason.astype(object), final_product.astype(object)
+
+    def reason_vector(self, cols, n):
+        rules, default, template = self._reason
+        joined = np.full(n, "", dtype=object)
+        for (_, check), text in rules:
+            mask   = check(cols, n)
+            sep    = np.where(joined == "", "", ", ").astype(object)
+            joined = np.where(mask, joined + sep + _format_vector(text, cols, n), joined)
+        joined = np.where(joined == "", default, joined).astype(object)
+        return _format_vector(template, {**cols, "reason": joined}, n)
+
+    def evaluate_columns(self, cols, n):
+        # Runs every stage over feature columns; returns the output columns.
+        cols = dict(cols)
+        cols["life_event"] = self.first_match_vector("life_event", cols, n)
+        cols["persona"]    = self.first_match_vector("persona", cols, n)
+        cols["product"]    = self.first_match_vector("product", cols, n)
+        confidence         = self.confidence_vector(cols, n)
+        guardrail, note, final_product = self.guardrail_vector(cols, n)
+        return {
+            "persona":        cols["persona"],
+            "life_event":     cols["life_event"],
+            "product":        final_product,
+            "confidence":     confidence.astype(int),
+            "reason":         self.reason_vector(cols, n),
+            "guardrail":      guardrail,
+            "guardrail_note": note,
+        }
+
+
+# ── Loading ───────────────────────────────────────────────
+
+RULES_PATH = os.getenv("RULES_PATH")
+
+
+def load_ruleset(path=None):
+    path = path or RULES_PATH
+    if not path:
+        return RuleSet(DEFAULT_RULES)
+    with open(path) as f:
+        return RuleSet(json.load(f))
+
+
+def export_default_rules(path):
+    # starting point for a RULES_PATH file
+    with open(path, "w") as f:
+        json.dump(DEFAULT_RULES, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# ── Local SMTP Sink ───────────────────────────────────────
+# A minimal plain-text SMTP server that accepts any login and swallows
+# every message, for exercising mailer.py (pooling, retries, campaigns)
+# without a real mail account:
+#
+#   python smtp_sink.py --port 1025 --latency-ms 50 --error-rate 0.05
+#   SMTP_EMAIL=advisor@finpulse.test SMTP_PASSWORD=x SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_SECURITY=none
+#
+# --error-rate answers that share of DATA commands with a transient 451,
+# --save-dir writes each accepted message to a .eml file. Connection and
+# message counts are printed every --report-every seconds.
+
+SINK_LATENCY_MS = float(os.getenv("SINK_LATENCY_MS", "0"))
+SINK_ERROR_RATE = float(os.getenv("SINK_ERROR_RATE", "0"))
+
+config = {
+    "latency_ms": SINK_LATENCY_MS,
+    "error_rate": SINK_ERROR_RATE,
+    "save_dir":   None,
+}
+counters = {"connections": 0, "messages": 0, "rejected": 0}
+
+
+async def _reply(writer, line):
+    writer.write(line.encode() + b"\r\n")
+    await writer.drain()
+
+
+async def handle(reader, writer):
+    counters["connections"] += 1
+    await _reply(writer, "220 finpulse-sink ESMTP ready")
+    try:
+        while True:
+            raw = await reader.readline()
+            if not raw:
+                return
+            line    = raw.decode("latin-1").rstrip("\r\n")
+            command = line[:4].upper()
+
+            if command in ("EHLO", "HELO"):
+                if command == "EHLO":
+                    await _reply(writer, "250-finpulse-sink")
+                    await _reply(writer, "250-AUTH PLAIN LOGIN")
+                    await _reply(writer, "250 8BITMIME")
+                else:
+                    await _reply(writer, "250 finpulse-sink")
+            elif command == "AUTH":
+                parts = line.split()
+                if parts[1].upper() == "LOGIN":
+                    # username and password prompts, both accepted as given
+                    for _ in range(2 - (len(parts) > 2)):
+                        await _reply(writer, "334 VXNlcm5hbWU6")
+                        await reader.readline()
+                elif len(parts) < 3:
+                    await _reply(writer, "334 ")
+                    await reader.readline()
+                await _reply(writer, "235 2.7.0 Authentication successful")
+            elif command in ("MAIL", "RCPT"):
+                await _reply(writer, "250 OK")
+            elif command == "DATA":
+                await _reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    chunk = await reader.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    body.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                if config["latency_ms"]:
+                    await asyncio.sleep(config["latency_ms"] / 1000)
+                if random.random() < config["error_rate"]:
+                    counters["rejected"] += 1
+                    await _reply(writer, "451 4.3.0 Temporary failure, try again")
+                else:
+                    counters["messages"] += 1
+                    if config["save_dir"]:
+                        _save(b"".join(body))
+                    await _reply(writer, "250 OK queued")
+            elif command in ("RSET", "NOOP"):
+                await _reply(writer, "250 OK")
+            elif command == "QUIT":
+                await _reply(writer, "221 Bye")
+                return
+            else:
+                await _reply(writer, "502 5.5.2 Command not implemented")
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def _save(message):
+    os.makedirs(config["save_dir"], exist_ok=True)
+    name = f"{time.time_ns()}-{counters['messages']}.eml"
+    with open(os.path.join(config["save_dir"], name), "wb") as f:
+        f.write(message)
+
+
+async def report(every):
+    while True:
+        await asyncio.sleep(every)
+        print(f"connections {counters['connections']}  messages {counters['messages']}  "
+              f"rejected {counters['rejected']}", flush=True)
+
+
+async def serve(host, port, report_every):
+    server = await asyncio.start_server(handle, host, port)
+    print(f"SMTP sink listening on {host}:{port}", flush=True)
+    if report_every > 0:
+        asyncio.create_task(report(report_every))
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local SMTP sink server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--latency-ms", type=float, default=SINK_LATENCY_MS)
+    parser.add_argument("--error-rate", type=float, default=SINK_ERROR_RATE)
+    parser.add_argument("--save-dir", default=None)
+    parser.add_argument("--report-every", type=float, default=5)
+    args = parser.parse_args(argv)
+
+    config.update({
+        "latency_ms": args.latency_ms,
+        "error_rate": args.error_rate,
+        "save_dir":   args.save_dir,
+    })
+    try:
+        asyncio.run(serve(args.host, args.port, args.report_every))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
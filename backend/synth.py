@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from engine import CATEGORY_MAP
+
+# ── Synthetic Transactions ────────────────────────────────
+# Writes transaction files in the schema load_user_transactions reads
+# (Date, Description, Amount, Transaction Type, Category, Account Name),
+# with categories drawn from CATEGORY_MAP's source names. Each synthetic
+# customer is given a persona that shapes what they spend on and earn, so
+# the generated portfolio exercises every branch of the rules.
+#
+#   python synth.py data/synthetic.csv --users 10000 --rows 1000000 \
+#       --mix student=0.2,spender=0.3,saver=0.2,credit_dependent=0.2,general=0.1
+#
+# Account names are not in engine.ACCOUNT_TO_USER, so a JSON account map
+# is written next to the CSV; point ACCOUNT_MAP_PATH at it before running
+# the engine, API or portfolio CLI on the file.
+
+CATEGORIES = list(CATEGORY_MAP)
+
+# Relative category weights per persona; unlisted categories never occur.
+# They are chosen so that, over a few months of history, each persona lands
+# on the matching detect_persona branch (e.g. savers never buy food, since
+# any food count above 5 makes a spender).
+PERSONA_WEIGHTS = {
+    "student":          {"Education": 3, "Fast Food": 4, "Mobile Phone": 2, "Music": 2, "Paycheck": 1},
+    "spender":          {"Restaurants": 6, "Fast Food": 4, "Shopping": 6, "Air Travel": 2, "Gas & Fuel": 2,
+                         "Movies & Dvds": 3, "Paycheck": 3},
+    "saver":            {"Paycheck": 3, "Utilities": 3, "Mobile Phone": 2, "Transfer": 2, "Music": 1},
+    "credit_dependent": {"Paycheck": 2, "Credit Card Payment": 4, "Mortgage & Rent": 2, "Utilities": 2,
+                         "Home Improvement": 2},
+    "general":          {"Utilities": 3, "Mobile Phone": 3, "Music": 2, "Movies & Dvds": 1},
+}
+
+DEFAULT_MIX = {"student": 0.2, "spender": 0.3, "saver": 0.2, "credit_dependent": 0.2, "general": 0.1}
+
+# (low, high) amount per category; paychecks scale with the persona below
+AMOUNT_RANGES = {
+    "Restaurants": (8, 120), "Fast Food": (3, 25), "Groceries": (15, 220), "Paycheck": (1500, 4000),
+    "Mortgage & Rent": (700, 2500), "Gas & Fuel": (20, 90), "Air Travel": (120, 1200),
+    "Shopping": (10, 400), "Movies & Dvds": (5, 40), "Music": (1, 20), "Utilities": (30, 250),
+    "Mobile Phone": (20, 120), "Home Improvement": (25, 900), "Credit Card Payment": (100, 3000),
+    "Education": (200, 5000), "Transfer": (20, 2000),
+}
+
+INCOME_SCALE = {"student": 0.3, "spender": 3.0, "saver": 2.0, "credit_dependent": 0.3, "general": 1.0}
+
+DESCRIPTIONS = {
+    "Restaurants": ["Olive Garden", "Chipotle", "Local Bistro"], "Fast Food": ["McDonald's", "Subway", "Taco Bell"],
+    "Groceries": ["Whole Foods", "Trader Joe's", "Kroger"], "Paycheck": ["Payroll Deposit"],
+    "Mortgage & Rent": ["Monthly Rent"], "Gas & Fuel": ["Shell", "Chevron"], "Air Travel": ["Delta", "United"],
+    "Shopping": ["Amazon", "Target"], "Movies & Dvds": ["AMC Theatres", "Netflix"], "Music": ["Spotify"],
+    "Utilities": ["City Power & Light"], "Mobile Phone": ["Verizon"], "Home Improvement": ["Home Depot"],
+    "Credit Card Payment": ["Credit Card Payment"], "Education": ["University Tuition", "Textbooks"],
+    "Transfer": ["Online Transfer"],
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in PERSONA_WEIGHTS:
+            raise ValueError(f"unknown persona {name!r}, expected one of {list(PERSONA_WEIGHTS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def account_name(i):
+    return f"Synthetic Account {i:07d}"
+
+
+def user_id(i):
+    return f"user_{i:07d}"
+
+
+def account_map(users):
+    return {account_name(i): user_id(i) for i in range(users)}
+
+
+def assign_personas(users, mix, rng):
+    names   = list(mix)
+    weights = np.array([mix[n] for n in names], dtype=float)
+    return np.array(names)[rng.choice(len(names), size=users, p=weights / weights.sum())]
+
+
+def _category_probabilities():
+    probs = {}
+    for persona, overrides in PERSONA_WEIGHTS.items():
+        w = np.array([overrides.get(c, 0) for c in CATEGORIES], dtype=float)
+        probs[persona] = w / w.sum()
+    return probs
+
+
+def generate_chunk(rows, personas, rng, start="2024-01-01", days=365):
+    # Everything is drawn as integer codes and decoded with array indexing,
+    # so a chunk costs a handful of NumPy passes regardless of size.
+    users      = len(personas)
+    user_index = rng.integers(0, users, rows)
+    persona    = personas[user_index]
+
+    codes = np.empty(rows, dtype=np.int64)
+    for name, p in _category_probabilities().items():
+        mask = persona == name
+        if mask.any():
+            codes[mask] = rng.choice(len(CATEGORIES), size=int(mask.sum()), p=p)
+
+    low    = np.array([AMOUNT_RANGES[c][0] for c in CATEGORIES], dtype=float)[codes]
+    high   = np.array([AMOUNT_RANGES[c][1] for c in CATEGORIES], dtype=float)[codes]
+    amount = low + rng.random(rows) * (high - low)
+
+    paid       = codes == CATEGORIES.index("Paycheck")
+    user_scale = np.array([INCOME_SCALE[p] for p in personas], dtype=float)
+    amount[paid] *= user_scale[user_index[paid]]
+
+    credit = paid | ((codes == CATEGORIES.index("Transfer")) & (rng.random(rows) < 0.5))
+
+    # three description slots per category, repeating the shorter lists
+    slots        = np.array([[DESCRIPTIONS[c][k % len(DESCRIPTIONS[c])] for k in range(3)] for c in CATEGORIES],
+                            dtype=object)
+    description  = slots[codes, rng.integers(0, 3, rows)]
+    account_list = np.array([account_name(i) for i in range(users)], dtype=object)
+    dates        = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, rows), unit="D")
+
+    return pd.DataFrame({
+        "Date":             dates.strftime("%m/%d/%Y"),
+        "Description":      description,
+        "Amount":           np.round(amount, 2),
+        "Transaction Type": np.where(credit, "credit", "debit"),
+        "Category":         np.array(CATEGORIES, dtype=object)[codes],
+        "Account Name":     account_list[user_index],
+    })
+
+
+def write_transactions(path, users=1000, rows=100_000, mix=None, seed=42,
+                       start="2024-01-01", days=365, chunk_rows=1_000_000):
+    # Streams the file in chunks so memory stays bounded for 10M+ rows.
+    rng      = np.random.default_rng(seed)
+    personas = assign_personas(users, mix or DEFAULT_MIX, rng)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    written = 0
+    with open(path, "w", newline="") as f:
+        while written < rows:
+            n = min(chunk_rows, rows - written)
+            generate_chunk(n, personas, rng, start, days).to_csv(f, index=False, header=written == 0)
+            written += n
+
+    map_path = os.path.splitext(path)[0] + ".accounts.json"
+    with open(map_path, "w") as f:
+        json.dump(account_map(users), f)
+
+    names, counts = np.unique(personas, return_counts=True)
+    return map_path, {str(n): int(c) for n, c in zip(names, counts)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic transactions file.")
+    parser.add_argument("output", help="CSV path to write")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--mix", default=None, help="persona weights, e.g. student=0.2,spender=0.8")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start", default="2024-01-01", help="first transaction date")
+    parser.add_argument("--days", type=int, default=365, help="date range in days")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix) if args.mix else None
+    map_path, counts = write_transactions(
+        args.output, args.users, args.rows, mix, args.seed, args.start, args.days
+    )
+    print(f"Wrote {args.rows:,} rows for {args.users:,} users to {args.output}", file=sys.stderr)
+    print(f"Persona mix: {counts}", file=sys.stderr)
+    print(f"Account map: {map_path} (export ACCOUNT_MAP_PATH={map_path})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -43,17 +43,27 @@ export default function DashboardPage() {
       const token = localStorage.getItem('token');
       if (!token) return;
       try {
-        const res = await fetch(`${FASTAPI_URL}/admin/distinct-users`, {
-          headers: { 'Authorization': `Bearer ${token}` }
-        });
-        const data = await res.json();
-        console.log('RAW API RESPONSE:', data); // ← ADD THIS
-        if (data.distinct_users?.length > 0) {
-          const mapped = data.distinct_users.map((u: any) => ({
-            id: u.user_id,
-            name: u.name
-          }));
-          console.log('MAPPED CUSTOMERS:', mapped); // ← ADD THIS
+        // the endpoint is paginated: follow next_cursor until the last page
+        const mapped: Customer[] = [];
+        let cursor: string | null = null;
+        do {
+          const url = new URL(`${FASTAPI_URL}/admin/distinct-users`);
+          if (cursor) url.searchParams.set('cursor', cursor);
+          const res = await fetch(url.toString(), {
+            headers: { 'Authorization': `Bearer ${token}` }
+          });
+          if (!res.ok) {
+            console.error('FETCH ERROR:', res.status);
+            break;
+          }
+          const data = await res.json();
+          for (const u of data.distinct_users ?? []) {
+            mapped.push({ id: u.user_id, name: u.name });
+          }
+          cursor = data.next_cursor ?? null;
+        } while (cursor);
+        console.log('MAPPED CUSTOMERS:', mapped.length);
+        if (mapped.length > 0) {
           setCustomers(mapped);
           setSelectedCustomer(mapped[0]);
         }